@@ -0,0 +1,276 @@
+"""
+Benchmarks for the hot paths: board generation, click resolution, the
+majority vote, a full scripted game and drawing a frame.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+With --baseline the run fails when a benchmark's median got slower than the
+baseline by more than --tolerance.
+"""
+from benchmarks import stub_pyxel
+
+import argparse
+import json
+import platform
+import random
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+pyxel = stub_pyxel.install()
+
+from qcatsweeper import backends  # noqa: E402
+from qcatsweeper.engine import GameEngine  # noqa: E402
+from qcatsweeper.entropy import SeededProvider  # noqa: E402
+from qcatsweeper.event_log import EventLogWriter, replay  # noqa: E402
+from qcatsweeper.simulator import group_policy, play_game, scan_policy  # noqa: E402
+from qcatsweeper.statevector import GroupStates, rebuild_state  # noqa: E402
+
+import qcatsweeper.gui as QGUI  # noqa: E402
+import qcatsweeper.quantum_logic as ql  # noqa: E402
+
+
+def bench(fn, min_time=0.2, repeat=5):
+    """
+    Times `fn` in `repeat` runs of as many calls as fit in `min_time`.
+    returns per call timings in microseconds
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) / number)
+
+    runs = [r * 1e6 for r in runs]
+    return {
+        'calls': number,
+        'min_us': min(runs),
+        'median_us': statistics.median(runs),
+        'mean_us': statistics.mean(runs),
+    }
+
+
+def board_benchmarks():
+    for size in (12, 64, 256, 1024):
+        # main.py's density is about size * size // 7, half the board is
+        # the dense case where most draws land on a bomb already placed
+        for bomb_no in (20, size * size // 8, size * size // 2):
+            yield 'new_game_grid/{}x{}/bombs={}'.format(size, size, bomb_no), \
+                lambda size=size, bomb_no=bomb_no: ql.new_game_grid(size, bomb_no=bomb_no)
+
+
+def available_backends():
+    found = {'analytic': backends.AnalyticBackend(random.Random(0))}
+    try:
+        import qiskit  # noqa: F401
+        found['qiskit'] = backends.QiskitBackend(ql.device)
+    except ImportError:
+        pass
+    return found
+
+
+def click_benchmarks():
+    clicks = {
+        'bomb': (ql.TileItems.BOMB_UNEXPLODED, 1),
+        'group1': (ql.TileItems.GROUP1, 1),
+        'group3_click2': (ql.TileItems.GROUP3, 2),
+        'group5_click3': (ql.TileItems.GROUP5, 3),
+        'blank': (ql.TileItems.BLANKS, 1),
+    }
+    for backend_name, backend in available_backends().items():
+        for click_name, (tile, num_clicks) in clicks.items():
+            def run(backend=backend, tile=tile, num_clicks=num_clicks):
+                ql.set_backend(backend)
+                ql.onclick(tile, num_clicks)
+            yield 'onclick/{}/{}'.format(backend_name, click_name), run
+
+
+def majority_benchmarks():
+    circuit, index = ql.CLICK_CIRCUITS[('two_click', 1)]
+    for backend_name, backend in available_backends().items():
+        for shots in (64, 256, 1024):
+            for sampling in ('fixed', 'sequential'):
+                def run(backend=backend, shots=shots, sampling=sampling):
+                    ql.set_backend(backend)
+                    ql.set_sampling(sampling)
+                    saved, ql.shots = ql.shots, shots
+                    try:
+                        ql.get_one_or_zero(circuit, index)
+                    finally:
+                        ql.shots = saved
+                        ql.set_sampling('fixed')
+                yield 'get_one_or_zero/{}/shots={}/{}'.format(
+                    backend_name, shots, sampling), run
+
+
+def game_benchmarks():
+    ql.set_backend(backends.AnalyticBackend(random.Random(0)))
+    rng = random.Random(0)
+    engine = GameEngine(12, 20)
+
+    def run():
+        engine.reset()
+        play_game(engine, scan_policy, rng)
+    yield 'game/scripted/12x12', run
+
+
+def group_state_benchmarks():
+    # One more click on a group that has had `history` clicks, on its
+    # persistent state against rebuilding that state from every past click.
+    # The persistent state keeps evolving, its cost doesn't grow with it
+    tile = ql.TileItems.GROUP5
+    for history in (1, 10, 100):
+        group_states = GroupStates(rng=random.Random(0))
+        kinds, results = [], []
+        for i in range(history):
+            num_clicks = 1 + i % 3
+            kinds.append(ql.click_kind(tile, num_clicks))
+            results.append(int(group_states.click(tile, num_clicks) is not ql.TileItems.NEG_EVAL))
+
+        def incremental(group_states=group_states):
+            group_states.click(tile, 1)
+
+        def rebuilt(kinds=kinds, results=results):
+            rebuild_state(kinds, results).prob_one(0)
+        yield 'group_state/incremental/history={}'.format(history), incremental
+        yield 'group_state/rebuild/history={}'.format(history), rebuilt
+
+    snapshot = group_states.snapshot()
+    yield 'group_state/snapshot_restore', lambda: group_states.restore(snapshot)
+
+
+def replay_benchmarks():
+    # A recorded log of 200 games is replayed as a whole
+    ql.set_backend(backends.AnalyticBackend(random.Random(0)))
+    rng = random.Random(0)
+    fd, path = tempfile.mkstemp(suffix='.qlog')
+    os.close(fd)
+    os.remove(path)
+
+    event_log = EventLogWriter(path)
+    engine = GameEngine(12, 20, event_log=event_log)
+    for game in range(200):
+        if game:
+            engine.reset()
+        play_game(engine, group_policy, rng)
+    event_log.close()
+
+    try:
+        yield 'replay/200_games/12x12', lambda: replay(path)
+    finally:
+        os.remove(path)
+
+
+def draw_benchmarks():
+    ql.set_backend(backends.AnalyticBackend(random.Random(0)))
+    app = QGUI.QuantumCatsweeperApp()
+    app.reset_game()
+    app.game_state = QGUI.GameState.PLAYING_REAL
+
+    yield 'draw_grid/fresh', app.draw_grid
+    yield 'draw_playscreen/fresh', app.draw_playscreen
+    yield 'draw_playscreen/unchanged', lambda: app.draw_playscreen(False)
+
+    # Half of the board clicked
+    rng = random.Random(0)
+    for _ in range(72):
+        app.engine.click(rng.randrange(12), rng.randrange(12))
+    yield 'draw_grid/half_clicked', app.draw_grid
+    yield 'draw_playscreen/half_clicked', app.draw_playscreen
+    yield 'draw_playscreen/half_clicked_unchanged', lambda: app.draw_playscreen(False)
+
+
+SUITES = {
+    'board': board_benchmarks,
+    'click': click_benchmarks,
+    'majority': majority_benchmarks,
+    'game': game_benchmarks,
+    'group_state': group_state_benchmarks,
+    'replay': replay_benchmarks,
+    'draw': draw_benchmarks,
+}
+
+
+def run_suites(names, min_time):
+    # Boards come out the same every run
+    ql.set_entropy_source(SeededProvider(0))
+
+    results = {}
+    for suite in names:
+        for name, fn in SUITES[suite]():
+            results[name] = bench(fn, min_time)
+            print('{:<50} {:>12.2f} us'.format(name, results[name]['median_us']),
+                  file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    returns a list of (name, baseline median, new median) that got slower
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['median_us']
+        if result['median_us'] > before * (1 + tolerance):
+            regressions.append((name, before, result['median_us']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantum catsweeper benchmarks')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help='suites to run, all of them by default')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds to spend on each benchmark')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--save-baseline', help='write results as a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline, 0.25 = 25%%')
+    args = parser.parse_args()
+
+    results = run_suites(args.suite or sorted(SUITES), args.min_time)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print('REGRESSION {}: {:.2f} us -> {:.2f} us'.format(name, before, after),
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Stand-in for the pyxel module so the drawing code can be timed without a
+window. Every drawing call is counted instead of rendered.
+"""
+import sys
+import types
+
+calls = {}
+
+
+class _Image:
+    def __getattr__(self, name):
+        return _counted('image.' + name)
+
+
+class _Sound:
+    def set(self, *args, **kwargs):
+        pass
+
+
+def _counted(name):
+    def call(*args, **kwargs):
+        calls[name] = calls.get(name, 0) + 1
+    return call
+
+
+def install():
+    """
+    Puts the stub in sys.modules as 'pyxel', has to run before
+    qcatsweeper.gui is imported.
+    """
+    pyxel = types.ModuleType('pyxel')
+    pyxel.mouse_x = 0
+    pyxel.mouse_y = 0
+    pyxel.frame_count = 0
+    pyxel.pressed = set()
+
+    for name in ('init', 'run', 'quit', 'play', 'stop', 'cls', 'rect', 'rectb',
+                 'text', 'blt', 'pix', 'line', 'circ'):
+        setattr(pyxel, name, _counted(name))
+
+    pyxel.image = lambda img, *args: _Image()
+    pyxel.sound = lambda snd, *args: _Sound()
+    pyxel.btnp = lambda key, *args: key in pyxel.pressed
+    pyxel.btn = lambda key, *args: key in pyxel.pressed
+
+    # Key constants are only compared, any distinct value will do
+    def __getattr__(name):
+        if name.startswith('KEY_'):
+            value = hash(name)
+            setattr(pyxel, name, value)
+            return value
+        raise AttributeError(name)
+
+    pyxel.__getattr__ = __getattr__
+    sys.modules['pyxel'] = pyxel
+    return pyxel
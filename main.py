@@ -1,9 +1,83 @@
+from qcatsweeper import profiling
+from qcatsweeper.event_log import EventLogWriter
+
 import qcatsweeper.gui as QGUI
 import qcatsweeper.quantum_logic as ql
+import atexit
 import sys
 
 
-debugging = len(sys.argv) > 1
-QGUI.QuantumCatsweeperApp(debugging=debugging)
+debugging = 'debug' in sys.argv[1:]
+# Raw measurement counts are printed in debugging mode
+profiling.verbose = debugging
+click_batch_size = 1
+grid_size = 12
+board_queue_depth = 2
+event_log = None
+share_name = None
+
+# Bigger boards scroll, e.g. size=64
+# boards=N keeps N boards generated ahead of time for new games
+for arg in sys.argv[1:]:
+    if arg.startswith('size='):
+        grid_size = int(arg[len('size='):])
+    if arg.startswith('boards='):
+        board_queue_depth = int(arg[len('boards='):])
+    # profile=FILE writes timings as JSON when the game exits
+    if arg.startswith('profile='):
+        atexit.register(profiling.export, arg[len('profile='):])
+    # record=FILE appends every game to a binary event log for replay
+    if arg.startswith('record='):
+        event_log = EventLogWriter(arg[len('record='):])
+        atexit.register(event_log.close)
+    # share=NAME puts the game in shared memory for other processes to follow
+    if arg.startswith('share='):
+        share_name = arg[len('share='):]
+
+shared = None
+if share_name is not None:
+    # Imported here, it needs numpy which the game otherwise loads later
+    from qcatsweeper.shared_state import SharedGame
+    shared = SharedGame.create(grid_size, grid_size, name=share_name)
+    atexit.register(shared.close)
+
+# Classic minesweeper numbers, tiles show how many bombs are around them
+classic = 'classic' in sys.argv[1:]
+
+# Every group keeps one quantum state that each of its clicks evolves and
+# measures, instead of a fresh circuit per click
+quantum_groups = 'stateful' in sys.argv[1:]
+
+# Local engines only, no qiskit or network access whatever else is asked for
+offline = 'offline' in sys.argv[1:]
+if offline:
+    ql.set_offline()
+
+# Local analytic engine by default, 'qiskit' runs clicks through qiskit
+if 'qiskit' in sys.argv[1:] and not offline:
+    # Jobs run asynchronously, clicks fall back to the analytic engine when
+    # the device takes longer than 30 seconds
+    ql.enable_job_manager(latency_budget=30.0)
+    # Outcomes are prefetched in batches so clicks rarely wait on a job
+    ql.enable_outcome_pool()
+    # Clicks made while a job runs share the next one, one qubit each
+    click_batch_size = 5
+
+# Local emulator of the noisy ibmqx4 device, works offline too
+if 'emulator' in sys.argv[1:]:
+    ql.set_backend('emulator')
+
+# Bomb positions from the ANU quantum random number generator (needs network)
+if 'anu' in sys.argv[1:] and not offline:
+    ql.set_entropy_source('anu')
+
+# 20 bombs on the original 12x12 board, the same density on any other size,
+# and always at least one tile free for the golden cat
+bomb_no = min(grid_size ** 2 - 1, max(1, 20 * grid_size ** 2 // 144))
+
+QGUI.QuantumCatsweeperApp(debugging=debugging, click_batch_size=click_batch_size,
+                          grid_size=grid_size, bomb_no=bomb_no,
+                          board_queue_depth=board_queue_depth, event_log=event_log,
+                          classic=classic, quantum_groups=quantum_groups, shared=shared)
 
 # ql.onclick(ql.TileItems.GROUP2, 1)
@@ -0,0 +1,388 @@
+from collections import namedtuple, OrderedDict
+
+from qcatsweeper import profiling
+
+import cmath
+import math
+import random
+import threading
+
+
+# A circuit is a list of single qubit gates applied to |0...0>. Every tile
+# click only ever needs one gate and one measured qubit, so this is all the
+# backends have to understand.
+Gate = namedtuple('Gate', ['name', 'qubit', 'params'])
+Circuit = namedtuple('Circuit', ['gates', 'num_qubits'])
+
+
+def h_gate(qubit):
+    return Gate('h', qubit, ())
+
+
+def u3_gate(theta, phi, lam, qubit):
+    return Gate('u3', qubit, (theta, phi, lam))
+
+
+def gate_matrix(gate):
+    if gate.name == 'h':
+        s = 1 / math.sqrt(2)
+        return ((s, s), (s, -s))
+
+    if gate.name == 'u3':
+        theta, phi, lam = gate.params
+        return ((math.cos(theta / 2),
+                 -cmath.exp(1j * lam) * math.sin(theta / 2)),
+                (cmath.exp(1j * phi) * math.sin(theta / 2),
+                 cmath.exp(1j * (phi + lam)) * math.cos(theta / 2)))
+
+    raise ValueError('Unsupported gate: {}'.format(gate.name))
+
+
+def prob_one(circuit, index):
+    """
+    Exact probability of measuring a 1 on qubit `index`. The gates never
+    entangle qubits so each one can be tracked as its own 2-amplitude state.
+    """
+    a0, a1 = 1, 0
+    for gate in circuit.gates:
+        if gate.qubit != index:
+            continue
+        m = gate_matrix(gate)
+        a0, a1 = m[0][0] * a0 + m[0][1] * a1, m[1][0] * a0 + m[1][1] * a1
+    return abs(a1) ** 2
+
+
+def majority_prob_one(p, shots):
+    """
+    Probability that `shots` measurements of a qubit with P(1) = p end up
+    with at least as many 1s as 0s (ties go to 1, like get_one_or_zero).
+    """
+    if p <= 0.0:
+        return 0.0
+    if p >= 1.0:
+        return 1.0
+
+    # Summed in log space, comb(1024, 512) alone is close to overflowing
+    log_p = math.log(p)
+    log_q = math.log(1 - p)
+    log_n = math.lgamma(shots + 1)
+    total = 0.0
+    for k in range((shots + 1) // 2, shots + 1):
+        total += math.exp(log_n - math.lgamma(k + 1) - math.lgamma(shots - k + 1) +
+                          k * log_p + (shots - k) * log_q)
+    return min(total, 1.0)
+
+
+class OutcomeBackend:
+    """
+    Resolves the majority vote of measuring one qubit of a circuit over a
+    number of shots. Backends that only produce counts implement `counts`,
+    backends that can do better override `majority`.
+    """
+    name = None
+
+    def counts(self, circuit, index, shots):
+        raise NotImplementedError
+
+    def majority(self, circuit, index, shots):
+        return majority_from_counts(self.counts(circuit, index, shots), index)
+
+    def sequential_majority(self, circuit, index, max_shots, batch_shots=32,
+                            confidence=0.99):
+        """
+        Runs shots in batches of `batch_shots` and stops as soon as the
+        majority of a full `max_shots` run is decided with the given
+        confidence.
+
+        returns (majority, shots used)
+        """
+        marginal = {'0': 0, '1': 0}
+        used = 0
+        while used < max_shots:
+            batch = min(batch_shots, max_shots - used)
+            counts = marginal_counts(self.counts(circuit, index, batch), index)
+            marginal['0'] += counts['0']
+            marginal['1'] += counts['1']
+            used += batch
+
+            if used < max_shots and \
+                    majority_flip_probability(marginal['1'], used, max_shots) < 1 - confidence:
+                break
+
+        return majority_from_marginal(marginal), used
+
+    def majority_batch(self, decisions, shots):
+        """
+        params:
+        decisions: list of (circuit, measured qubit index)
+        returns the majority outcome of each decision, in order
+        """
+        return [self.majority(circuit, index, shots) for circuit, index in decisions]
+
+    def cancel_all(self):
+        # Only backends with queued jobs have anything to cancel
+        pass
+
+    def stop(self):
+        # Only backends with their own threads have anything to stop
+        pass
+
+
+def pack_decisions(decisions, num_qubits=5):
+    """
+    Packs independent decisions onto the qubits of as few circuits as
+    possible. Only the gates acting on a decision's measured qubit matter, so
+    they are moved onto the next free qubit.
+
+    returns a list of (circuit, [(qubit, decision position), ...])
+    """
+    packed = []
+    for start in range(0, len(decisions), num_qubits):
+        gates = []
+        slots = []
+        for qubit, (circuit, index) in enumerate(decisions[start:start + num_qubits]):
+            gates.extend(gate._replace(qubit=qubit)
+                         for gate in circuit.gates if gate.qubit == index)
+            slots.append((qubit, start + qubit))
+        packed.append((Circuit(tuple(gates), num_qubits), slots))
+    return packed
+
+
+def marginal_counts(counts, index):
+    """
+    Counts of a single qubit out of the multi qubit counts from get_counts.
+    Bitstrings are little endian, qubit 0 is the rightmost character.
+    """
+    marginal = {'0': 0, '1': 0}
+    for bits, count in counts.items():
+        marginal[bits.replace(' ', '')[-1 - index]] += count
+    return marginal
+
+
+def majority_from_marginal(marginal):
+    if marginal['0'] > marginal['1']:
+        return 0
+    return 1
+
+
+def majority_from_counts(counts, index):
+    # measuring qubit and finding which value has the most outcomes, an
+    # outcome that was never observed simply counts as 0
+    profiling.log('counts', counts)
+    return majority_from_marginal(marginal_counts(counts, index))
+
+
+def majority_flip_probability(ones, used, max_shots):
+    """
+    Probability that finishing a `max_shots` run changes the majority seen
+    after `used` shots with `ones` 1s. The remaining shots are predicted from
+    a uniform prior on P(1) updated with the observed shots (beta-binomial,
+    normal approximation), so a lucky early streak isn't taken at face value.
+    """
+    leader = 1 if ones >= used - ones else 0
+    remaining = max_shots - used
+
+    # 1 wins the full run once it has at least half of the shots
+    needed = math.ceil(max_shots / 2) - ones
+    if needed <= 0:
+        return 0.0 if leader == 1 else 1.0
+    if needed > remaining:
+        return 0.0 if leader == 0 else 1.0
+
+    a = ones + 1
+    b = used - ones + 1
+    mean = remaining * a / (a + b)
+    var = remaining * a * b * (a + b + remaining) / ((a + b) ** 2 * (a + b + 1))
+
+    # P(X >= needed) for the remaining 1s, continuity corrected
+    z = (needed - 0.5 - mean) / math.sqrt(var)
+    p_one_wins = 0.5 * math.erfc(z / math.sqrt(2))
+    return 1 - p_one_wins if leader == 1 else p_one_wins
+
+
+class AnalyticBackend(OutcomeBackend):
+    """
+    Computes the exact distribution of the circuit and draws the majority
+    outcome directly instead of simulating every shot.
+    """
+    name = 'analytic'
+
+    def __init__(self, rng=None):
+        self._rng = rng or random.Random()
+        self._majority_cache = {}
+
+    def majority_probability(self, circuit, index, shots):
+        p = prob_one(circuit, index)
+        key = (round(p, 12), shots)
+        if key not in self._majority_cache:
+            self._majority_cache[key] = majority_prob_one(p, shots)
+        return self._majority_cache[key]
+
+    def counts(self, circuit, index, shots):
+        p = prob_one(circuit, index)
+        ones = sum(1 for _ in range(shots) if self._rng.random() < p)
+        zero_key = '0' * circuit.num_qubits
+        one_key = zero_key[:circuit.num_qubits - 1 - index] + '1' + \
+            zero_key[circuit.num_qubits - index:]
+        return {zero_key: shots - ones, one_key: ones}
+
+    def majority(self, circuit, index, shots):
+        if self._rng.random() < self.majority_probability(circuit, index, shots):
+            return 1
+        return 0
+
+
+class CircuitCache:
+    """
+    Bounded LRU cache of compiled circuits, safe to share between threads.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, build):
+        """
+        Returns the entry for `key`, calling `build()` to create it if needed.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            entry = build()
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CountsBackend(OutcomeBackend):
+    """
+    A backend that runs whole circuits and returns qiskit style counts.
+    Subclasses implement `_execute`, batches of decisions are run as a
+    single execution.
+    """
+
+    def __init__(self, pack=True):
+        """
+        params:
+        pack: put independent decisions of a batch on separate qubits of the
+              same circuit instead of one circuit each
+        """
+        self.pack = pack
+
+    def _execute(self, circuits, shots):
+        """
+        params:
+        circuits: list of (circuit, measured qubit indexes)
+        returns the counts of each circuit, as returned by get_counts
+        """
+        raise NotImplementedError
+
+    def counts(self, circuit, index, shots):
+        return self._execute([(circuit, [index])], shots)[0]
+
+    def majority_batch(self, decisions, shots):
+        if not decisions:
+            return []
+
+        if self.pack:
+            packed = pack_decisions(decisions, decisions[0][0].num_qubits)
+        else:
+            packed = [(circuit, [(index, i)])
+                      for i, (circuit, index) in enumerate(decisions)]
+
+        # All circuits go out in a single run
+        all_counts = self._execute(
+            [(circuit, [qubit for qubit, _ in slots]) for circuit, slots in packed], shots)
+
+        # Demultiplex every decision from its qubit's marginal counts
+        outcomes = [None] * len(decisions)
+        for counts, (_, slots) in zip(all_counts, packed):
+            for qubit, position in slots:
+                outcomes[position] = majority_from_marginal(
+                    marginal_counts(counts, qubit))
+        return outcomes
+
+
+class QiskitBackend(CountsBackend):
+    """
+    Runs the circuit on a qiskit backend, either the local simulator or a
+    real IBM Q device. Circuits are compiled once and cached, keyed by their
+    gates, measured qubits, device and shots.
+    """
+    name = 'qiskit'
+
+    def __init__(self, device='local_qasm_simulator', timeout=1800, pack=True,
+                 cache_size=64):
+        """
+        params:
+        device: qiskit backend name
+        timeout: seconds to wait for a job
+        pack: see CountsBackend
+        cache_size: maximum number of compiled circuit sets kept around
+        """
+        super().__init__(pack)
+        self.device = device
+        self.timeout = timeout
+        self.circuit_cache = CircuitCache(cache_size)
+
+    def _compile(self, circuits, shots):
+        """
+        Compiles a list of (circuit, measured qubits) into one qobj. Every
+        cache entry gets its own QuantumProgram so evicting it drops all of
+        its registers and circuits.
+        """
+        from qiskit import QuantumProgram
+
+        Q_program = QuantumProgram()
+        names = []
+        for i, (circuit, indexes) in enumerate(circuits):
+            names.append("gridScript{}".format(i))
+            q = Q_program.create_quantum_register("q{}".format(i), circuit.num_qubits)
+            c = Q_program.create_classical_register("c{}".format(i), circuit.num_qubits)
+            gridScript = Q_program.create_circuit(names[-1], [q], [c])
+
+            for gate in circuit.gates:
+                getattr(gridScript, gate.name)(*(gate.params + (q[gate.qubit],)))
+            for index in indexes:
+                gridScript.measure(q[index], c[index])
+
+        qobj = Q_program.compile(names, backend=self.device, shots=shots)
+        return Q_program, qobj, names
+
+    def _execute(self, circuits, shots):
+        circuits = [(circuit, tuple(indexes)) for circuit, indexes in circuits]
+        key = (tuple(circuits), self.device, shots)
+        Q_program, qobj, names = self.circuit_cache.get(
+            key, lambda: self._compile(circuits, shots))
+
+        with profiling.timer('backend.qiskit.run'):
+            results = Q_program.run(qobj, timeout=self.timeout)
+        return [results.get_counts(name) for name in names]
+
+
+def noisy_emulator_backend(*args, **kwargs):
+    # Imported here, the emulator needs numpy
+    from qcatsweeper.emulator import NoisyEmulatorBackend
+    return NoisyEmulatorBackend(*args, **kwargs)
+
+
+BACKENDS = {
+    AnalyticBackend.name: AnalyticBackend,
+    QiskitBackend.name: QiskitBackend,
+    'emulator': noisy_emulator_backend,
+}
@@ -0,0 +1,199 @@
+import numpy as np
+
+from qcatsweeper.quantum_logic import TileItems
+
+
+# Tiles are stored as their TileItems value, every value fits in an int8
+_TILES = {tile.value: tile for tile in TileItems}
+
+GROUPS = (TileItems.GROUP1, TileItems.GROUP2, TileItems.GROUP3,
+          TileItems.GROUP4, TileItems.GROUP5, TileItems.GROUP6)
+
+# Size of the blocks of tiles that share a group
+GROUP_BLOCK_HEIGHT = 4
+GROUP_BLOCK_WIDTH = 6
+
+
+class BoardRow:
+    """
+    One row of a Board, so the board can still be used as board[row][col].
+    """
+
+    def __init__(self, board, row):
+        self._board = board
+        self._row = row
+
+    def __len__(self):
+        return self._board.width
+
+    def __getitem__(self, col):
+        return self._board.get(self._row, col)
+
+    def __setitem__(self, col, tile):
+        self._board.set(self._row, col, tile)
+
+    def __iter__(self):
+        return (_TILES[v] for v in self._board.codes[self._row].tolist())
+
+
+class Board:
+    """
+    Game board backed by an int8 array of TileItems values, indexed
+    [row][col] like the old list of lists.
+
+    The board also keeps an index of where each kind of tile is, built the
+    first time a kind is looked up and then kept up to date by `set`. Change
+    tiles through `set` or board[row][col], writing to `codes` directly
+    would leave the index stale.
+    """
+
+    def __init__(self, codes):
+        self.codes = np.asarray(codes, dtype=np.int8)
+
+        # TileItems value -> set of flat positions
+        self._index = {}
+
+    @property
+    def height(self):
+        return self.codes.shape[0]
+
+    @property
+    def width(self):
+        return self.codes.shape[1]
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, row):
+        if not -self.height <= row < self.height:
+            raise IndexError('board row out of range')
+        return BoardRow(self, row)
+
+    def __iter__(self):
+        return (BoardRow(self, row) for row in range(self.height))
+
+    def get(self, row, col):
+        return _TILES[int(self.codes[row, col])]
+
+    def set(self, row, col, tile):
+        old = int(self.codes[row, col])
+        if old == tile.value:
+            return
+
+        self.codes[row, col] = tile.value
+        pos = row * self.width + col
+        if old in self._index:
+            self._index[old].discard(pos)
+        if tile.value in self._index:
+            self._index[tile.value].add(pos)
+
+    def _positions(self, tile):
+        if tile.value not in self._index:
+            self._index[tile.value] = set(np.flatnonzero(self.codes == tile.value).tolist())
+        return self._index[tile.value]
+
+    def positions(self, tile):
+        """
+        returns the (row, col) of every tile of this kind
+        """
+        rows, cols = np.divmod(self.flat_positions(tile), self.width)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def flat_positions(self, tile):
+        """
+        returns row * width + col of every tile of this kind as an array
+        """
+        positions = self._positions(tile)
+        return np.fromiter(positions, dtype=np.int64, count=len(positions))
+
+    def count(self, tile):
+        return len(self._positions(tile))
+
+    def group_positions(self, group):
+        return self.positions(group)
+
+    def bomb_positions(self):
+        return self.positions(TileItems.BOMB_UNEXPLODED)
+
+    @property
+    def golden_cat(self):
+        """
+        (row, col) of the golden cat, None if there isn't one
+        """
+        for pos in self._positions(TileItems.GOLDEN_CAT):
+            return divmod(pos, self.width)
+        return None
+
+    def tolist(self):
+        return [list(row) for row in self]
+
+    def copy(self):
+        return Board(self.codes.copy())
+
+
+def _bomb_positions(pool, cells, bomb_no, exclude):
+    """
+    `bomb_no` distinct flat positions out of `cells`, never `exclude`, drawn
+    from the entropy pool.
+    """
+    if bomb_no > cells - 1:
+        raise ValueError('{} bombs do not fit on {} tiles'.format(bomb_no, cells))
+
+    # Every position taken so far, so a draw is checked in O(1) however many
+    # bombs there already are
+    taken = np.zeros(cells, dtype=bool)
+    taken[exclude] = True
+    # Scratch space to drop the positions drawn twice in one batch
+    first = np.empty(cells, dtype=np.int32)
+
+    chosen = []
+    found = 0
+    while found < bomb_no:
+        wanted = bomb_no - found
+        numbers = np.array(pool.get_uint16(wanted * 2), dtype=np.int64)
+        candidates = ((numbers[0::2] << 16) | numbers[1::2]) % cells
+        candidates = candidates[~taken[candidates]]
+
+        # Keep the first occurrence of each new position, in draw order
+        order = np.arange(candidates.size, dtype=np.int32)
+        first[candidates[::-1]] = order[::-1]
+        candidates = candidates[first[candidates] == order][:wanted]
+
+        taken[candidates] = True
+        chosen.append(candidates)
+        found += candidates.size
+    return np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+
+
+def generate_board(pool, width, height=None, bomb_no=20):
+    """
+    params:
+    pool: entropy.EntropyPool to draw from
+    width, height: board size in tiles, any size works
+    bomb_no: number of bombs, all on distinct tiles and never on the cat
+    """
+    height = width if height is None else height
+    rng = np.random.default_rng(pool.get_bits(64))
+
+    # construct groups of numbers for tiles, every block of tiles gets the
+    # next group of a shuffled list, about half of each block is blank
+    groups = np.array([GROUPS[i].value for i in rng.permutation(len(GROUPS))],
+                      dtype=np.int8)
+    # (block row * blocks per row + block col) % 6, worked out per row and
+    # per column so the full board only ever sees int8 arithmetic
+    blocks_per_row = -(-width // GROUP_BLOCK_WIDTH)
+    row_part = ((np.arange(height) // GROUP_BLOCK_HEIGHT) * blocks_per_row) % len(groups)
+    col_part = (np.arange(width) // GROUP_BLOCK_WIDTH) % len(groups)
+    block = (row_part.astype(np.int8)[:, None] + col_part.astype(np.int8)[None, :])
+    block %= len(groups)
+
+    codes = groups[block]
+    codes[~rng.integers(0, 2, size=(height, width), dtype=bool)] = 0
+
+    flat = codes.reshape(-1)
+    golden_cat = int(rng.integers(0, flat.size))
+    flat[_bomb_positions(pool, flat.size, bomb_no, golden_cat)] = \
+        TileItems.BOMB_UNEXPLODED.value
+    flat[golden_cat] = TileItems.GOLDEN_CAT.value
+
+    return Board(codes)
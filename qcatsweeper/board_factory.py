@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+
+
+class BoardFactory:
+    """
+    Keeps a small queue of ready game boards generated on a background
+    thread, so starting a new game doesn't wait on board generation and the
+    random number fetch behind it. Every board handed out is replaced
+    straight away.
+    """
+
+    def __init__(self, generate, depth=2):
+        """
+        params:
+        generate: function returning a new board
+        depth: number of boards kept ready
+        """
+        if depth < 1:
+            raise ValueError('depth must be at least 1')
+
+        self._generate = generate
+        self.depth = depth
+
+        self._boards = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._generation = 0
+        self._thread = None
+
+        self.handed_out = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.generated = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='BoardFactory', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            # Unblock a worker waiting on a full queue
+            self._drain()
+            self._thread.join()
+            self._thread = None
+
+    def get(self):
+        """
+        returns a ready board, or generates one here when the queue is empty
+        """
+        try:
+            board = self._boards.get_nowait()
+        except queue.Empty:
+            started = time.perf_counter()
+            board = self._generate()
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - started
+                self.generated += 1
+
+        with self._lock:
+            self.handed_out += 1
+        return board
+
+    def clear(self):
+        # Needed when the board settings or the entropy source change, the
+        # queued boards were made with the old ones
+        with self._lock:
+            self._generation += 1
+        self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                self._boards.get_nowait()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'handed_out': self.handed_out,
+                'waits': self.waits,
+                'wait_rate': self.waits / self.handed_out if self.handed_out else 0.0,
+                'wait_time': self.wait_time,
+                'generated': self.generated,
+                'ready': self._boards.qsize(),
+                'depth': self.depth,
+            }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                generation = self._generation
+            try:
+                board = self._generate()
+            except Exception as e:
+                # Resets generate their own boards until it recovers
+                print('Board generation failed: {}'.format(e))
+                self._stopped.wait(1.0)
+                continue
+
+            with self._lock:
+                self.generated += 1
+                if generation != self._generation:
+                    continue
+
+            # Blocks while the queue is full, checking now and then for stop
+            while not self._stopped.is_set():
+                try:
+                    self._boards.put(board, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
@@ -0,0 +1,129 @@
+"""
+Classic minesweeper layer: how many bombs touch every tile, and the
+reveal of the empty area around a tile with no bombs next to it.
+
+Everything works on whole arrays, so boards of millions of tiles cost a
+few passes over the board to set up and nothing per tile afterwards.
+"""
+import numpy as np
+
+from qcatsweeper.quantum_logic import TileItems
+
+
+def neighbour_counts(bombs):
+    """
+    returns an int8 array of how many of the 8 tiles around each tile are
+    bombs, a convolution of the bomb mask with a 3x3 ring done as 8 shifted
+    slices of a padded copy
+
+    params:
+    bombs: bool array, True where there is a bomb
+    """
+    height, width = bombs.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.int8)
+    padded[1:-1, 1:-1] = bombs
+
+    counts = np.zeros((height, width), dtype=np.int8)
+    for dr in range(3):
+        for dc in range(3):
+            if dr != 1 or dc != 1:
+                counts += padded[dr:dr + height, dc:dc + width]
+    return counts
+
+
+class NeighbourCounts:
+    """
+    Bomb counts of a board, kept up to date as bombs are defused or moved.
+    """
+
+    def __init__(self, board):
+        height, width = board.height, board.width
+        # Counts with a border of -1 around them, so the flood never has to
+        # check whether a neighbour is on the board
+        self._padded = np.full((height + 2, width + 2), -1, dtype=np.int8)
+        self._padded[1:-1, 1:-1] = neighbour_counts(
+            board.codes == TileItems.BOMB_UNEXPLODED.value)
+        self.counts = self._padded[1:-1, 1:-1]
+
+        padded_width = width + 2
+        self._neighbour_offsets = np.array(
+            [-padded_width - 1, -padded_width, -padded_width + 1, -1, 1,
+             padded_width - 1, padded_width, padded_width + 1], dtype=np.int64)
+
+        # Scratch space of flood, made on the first one and kept: which
+        # tiles a flood reached, all False between floods, and where each
+        # tile of a ring was first seen
+        self._seen = None
+        self._first = None
+
+    def get(self, row, col):
+        return int(self.counts[row, col])
+
+    def _add(self, row, col, amount):
+        # The 3x3 window clipped to the board, the tile itself doesn't count
+        window = self.counts[max(row - 1, 0):row + 2, max(col - 1, 0):col + 2]
+        window += amount
+        self.counts[row, col] -= amount
+
+    def remove_bomb(self, row, col):
+        self._add(row, col, -1)
+
+    def add_bomb(self, row, col):
+        self._add(row, col, 1)
+
+    def flood(self, row, col, can_reveal):
+        """
+        returns the flat positions (row * width + col) of the tiles revealed
+        by opening (row, col), starting with it: every tile connected to it
+        through tiles with no bombs around them, and the numbered tiles at
+        the edge of that area.
+
+        The area grows one ring at a time from the tiles added last, so the
+        work is proportional to the area revealed and there is no recursion.
+
+        params:
+        can_reveal: function of a flat position array returning a bool array,
+                    False for tiles that must stay as they are (face up
+                    already, the golden cat), they don't spread either
+        """
+        width = self.counts.shape[1]
+        padded_width = width + 2
+        counts = self._padded.reshape(-1)
+
+        start = np.array([(row + 1) * padded_width + col + 1], dtype=np.int64)
+        revealed = [np.array([row * width + col], dtype=np.int64)]
+        if counts[start[0]] != 0:
+            return revealed[0]
+
+        if self._seen is None:
+            self._seen = np.zeros(counts.size, dtype=bool)
+            self._first = np.empty(counts.size, dtype=np.int32)
+        seen, first = self._seen, self._first
+
+        # Every tile marked in seen, to clear just those afterwards
+        reached = [start]
+        seen[start] = True
+        try:
+            frontier = start
+            while frontier.size:
+                ring = (frontier[:, None] + self._neighbour_offsets).ravel()
+                ring = ring[~seen[ring]]
+                seen[ring] = True
+                reached.append(ring)
+                # Drop the tiles reached from two sides in this ring
+                order = np.arange(ring.size, dtype=np.int32)
+                first[ring] = order
+                ring = ring[(first[ring] == order) & (counts[ring] >= 0)]
+
+                rows, cols = np.divmod(ring, padded_width)
+                positions = (rows - 1) * width + cols - 1
+                allowed = can_reveal(positions)
+                ring = ring[allowed]
+                revealed.append(positions[allowed])
+
+                # Only tiles with no bombs around them spread any further
+                frontier = ring[counts[ring] == 0]
+        finally:
+            for ring in reached:
+                seen[ring] = False
+        return np.concatenate(revealed)
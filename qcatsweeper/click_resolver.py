@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from qcatsweeper import profiling
+
+import qcatsweeper.quantum_logic as ql
+import time
+
+
+class ClickResolver:
+    """
+    Resolves tile clicks on a worker pool so the pyxel frame loop never
+    waits on the quantum backend. Clicks are submitted with `submit` and the
+    finished ones are collected on a later frame with `completed`.
+
+    With batch_size > 1 clicks are queued and sent as one backend execution
+    of up to batch_size clicks whenever a worker is free, so clicks made
+    while a job is running share the next one.
+    """
+
+    def __init__(self, resolve=ql.onclick, max_workers=2, max_in_flight=4,
+                 batch_size=1, resolve_batch=ql.onclick_batch):
+        """
+        params:
+        resolve: function (clicked_tile, num_clicks) -> reveal state
+        max_workers: number of worker threads
+        max_in_flight: maximum number of clicks waiting on the backend
+        batch_size: maximum number of clicks resolved by one backend execution
+        resolve_batch: function [(clicked_tile, num_clicks)] -> [reveal state]
+        """
+        self._resolve = resolve
+        self._resolve_batch = resolve_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+
+        # (row, col) -> (future, clicked_tile, num_clicks, slot in the batch)
+        self._in_flight = {}
+        self._queued = []
+        self._batches = set()
+
+        # (row, col) -> time it was submitted, for the click latency
+        self._submitted = {}
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def can_submit(self):
+        return len(self._in_flight) < self.max_in_flight
+
+    def is_pending(self, pos):
+        return pos in self._in_flight
+
+    def pending_positions(self):
+        return list(self._in_flight)
+
+    def pending_clicks(self):
+        """
+        returns [(pos, clicked_tile, num_clicks)] of the clicks in flight, in
+        the order they were submitted
+        """
+        return [(pos, entry[1], entry[2]) for pos, entry in self._in_flight.items()]
+
+    def is_group_pending(self, clicked_tile):
+        return any(entry[1] is clicked_tile for entry in self._in_flight.values())
+
+    def submit(self, pos, clicked_tile, num_clicks):
+        if not self.can_submit() or pos in self._in_flight:
+            return False
+
+        self._submitted[pos] = time.perf_counter()
+
+        if self.batch_size <= 1:
+            future = self._executor.submit(self._resolve, clicked_tile, num_clicks)
+            self._in_flight[pos] = (future, clicked_tile, num_clicks, None)
+        else:
+            self._in_flight[pos] = (None, clicked_tile, num_clicks, None)
+            self._queued.append(pos)
+            self._flush()
+        return True
+
+    def _flush(self):
+        self._batches = set(f for f in self._batches if not f.done())
+
+        while self._queued and len(self._batches) < self.max_workers:
+            batch = self._queued[:self.batch_size]
+            self._queued = self._queued[self.batch_size:]
+
+            clicks = [self._in_flight[pos][1:3] for pos in batch]
+            future = self._executor.submit(self._resolve_batch, clicks)
+            self._batches.add(future)
+
+            for slot, pos in enumerate(batch):
+                _, clicked_tile, num_clicks, _ = self._in_flight[pos]
+                self._in_flight[pos] = (future, clicked_tile, num_clicks, slot)
+
+    def completed(self):
+        """
+        Returns (pos, clicked_tile, reveal_state) for every finished click, in
+        submission order, and forgets about them.
+        """
+        done = []
+        for pos, (future, clicked_tile, _, slot) in list(self._in_flight.items()):
+            if future is not None and future.done():
+                del self._in_flight[pos]
+                profiling.record('click.latency',
+                                 time.perf_counter() - self._submitted.pop(pos))
+
+                # A failed backend call counts as a click that didn't count
+                if future.exception() is not None:
+                    profiling.log('click.failed', str(future.exception()))
+                    done.append((pos, clicked_tile, None))
+                elif slot is None:
+                    done.append((pos, clicked_tile, future.result()))
+                else:
+                    done.append((pos, clicked_tile, future.result()[slot]))
+
+        # Queued clicks go out as soon as a worker frees up
+        self._flush()
+        return done
+
+    def cancel_all(self):
+        # Anything still running finishes on its own, its result is dropped
+        for future, _, _, _ in self._in_flight.values():
+            if future is not None:
+                future.cancel()
+        self._in_flight = {}
+        self._queued = []
+        self._batches = set()
+        self._submitted = {}
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,143 @@
+from collections import namedtuple
+
+import threading
+
+import numpy as np
+
+from qcatsweeper.backends import CountsBackend, gate_matrix
+
+
+# Every field is either one value for all qubits or one value per qubit.
+# readout_error_0: P(reading 1 | qubit in 0)
+# readout_error_1: P(reading 0 | qubit in 1)
+# depolarizing: depolarizing probability applied after every gate
+# t1, t2: relaxation and dephasing times in seconds, None for no decay
+# gate_time: duration of a gate in seconds
+# measure_delay: time between the last gate and the measurement in seconds
+NoiseModel = namedtuple('NoiseModel', [
+    'readout_error_0', 'readout_error_1', 'depolarizing', 't1', 't2',
+    'gate_time', 'measure_delay'])
+
+IDEAL = NoiseModel(0.0, 0.0, 0.0, None, None, 0.0, 0.0)
+
+# Roughly the published ibmqx4 calibration numbers
+IBMQX4 = NoiseModel(
+    readout_error_0=(0.03, 0.04, 0.03, 0.05, 0.04),
+    readout_error_1=(0.07, 0.08, 0.06, 0.09, 0.08),
+    depolarizing=(1.0e-3, 1.5e-3, 1.2e-3, 2.0e-3, 1.5e-3),
+    t1=(50e-6, 45e-6, 40e-6, 42e-6, 48e-6),
+    t2=(35e-6, 25e-6, 30e-6, 20e-6, 30e-6),
+    gate_time=100e-9,
+    measure_delay=1e-6)
+
+NOISE_MODELS = {
+    'ideal': IDEAL,
+    'ibmqx4': IBMQX4,
+}
+
+
+def _per_qubit(value, num_qubits):
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), (num_qubits,))
+
+
+def _decay(rho, elapsed, t1, t2):
+    """
+    Relaxation towards |0> and dephasing of a batch of 2x2 density matrices.
+    """
+    if t1 is None or t2 is None:
+        return rho
+    relax = np.exp(-elapsed / t1)
+    dephase = np.exp(-elapsed / t2)
+    rho = rho.copy()
+    rho[:, 0, 0] += rho[:, 1, 1] * (1 - relax)
+    rho[:, 1, 1] *= relax
+    rho[:, 0, 1] *= dephase
+    rho[:, 1, 0] *= dephase
+    return rho
+
+
+class NoisyEmulatorBackend(CountsBackend):
+    """
+    Local stand-in for a real device. Each qubit is tracked as a density
+    matrix through its gates with depolarizing noise and T1/T2 decay, then
+    every shot of every circuit in a run is sampled at once, with readout
+    errors, into qiskit style counts.
+    """
+    name = 'emulator'
+
+    def __init__(self, noise_model='ibmqx4', seed=None, pack=True):
+        """
+        params:
+        noise_model: a NoiseModel or one of the names in NOISE_MODELS
+        seed: seed for the shot sampling
+        pack: see CountsBackend
+        """
+        super().__init__(pack)
+        if isinstance(noise_model, str):
+            noise_model = NOISE_MODELS[noise_model]
+        self.noise_model = noise_model
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+        self._read_one_cache = {}
+
+    def read_one_probabilities(self, circuit, indexes):
+        """
+        returns P(reading 1) for every qubit of the circuit, 0 for the qubits
+        that aren't measured
+        """
+        key = (circuit, tuple(indexes))
+        if key in self._read_one_cache:
+            return self._read_one_cache[key]
+
+        n = circuit.num_qubits
+        noise = self.noise_model
+        depolarizing = _per_qubit(noise.depolarizing, n)
+        t1 = None if noise.t1 is None else _per_qubit(noise.t1, n)
+        t2 = None if noise.t2 is None else _per_qubit(noise.t2, n)
+
+        # Every qubit starts in |0><0|
+        rho = np.zeros((n, 2, 2), dtype=np.complex128)
+        rho[:, 0, 0] = 1
+        identity = np.eye(2)
+        for gate in circuit.gates:
+            q = gate.qubit
+            m = np.array(gate_matrix(gate), dtype=np.complex128)
+            rho[q] = m @ rho[q] @ m.conj().T
+            rho[q] = (1 - depolarizing[q]) * rho[q] + depolarizing[q] * identity / 2
+            if t1 is not None and t2 is not None:
+                rho[q:q + 1] = _decay(rho[q:q + 1], noise.gate_time, t1[q], t2[q])
+        rho = _decay(rho, noise.measure_delay, t1, t2)
+
+        p_one = np.clip(rho[:, 1, 1].real, 0.0, 1.0)
+        read_one = p_one * (1 - _per_qubit(noise.readout_error_1, n)) + \
+            (1 - p_one) * _per_qubit(noise.readout_error_0, n)
+
+        measured = np.zeros(n, dtype=bool)
+        measured[list(indexes)] = True
+        read_one = np.where(measured, read_one, 0.0)
+        self._read_one_cache[key] = read_one
+        return read_one
+
+    def _execute(self, circuits, shots):
+        num_qubits = max(circuit.num_qubits for circuit, _ in circuits)
+        probabilities = np.zeros((len(circuits), num_qubits))
+        for i, (circuit, indexes) in enumerate(circuits):
+            probabilities[i, :circuit.num_qubits] = \
+                self.read_one_probabilities(circuit, indexes)
+
+        # All shots of all circuits in one draw, then every shot's bits as
+        # an integer with qubit 0 as the lowest bit
+        with self._rng_lock:
+            bits = self._rng.random((len(circuits), shots, num_qubits)) < probabilities[:, None, :]
+        values = bits.astype(np.int64) @ (1 << np.arange(num_qubits))
+        offsets = np.arange(len(circuits))[:, None] << num_qubits
+        histogram = np.bincount((values + offsets).ravel(),
+                                minlength=len(circuits) << num_qubits)
+        histogram = histogram.reshape(len(circuits), 1 << num_qubits)
+
+        all_counts = []
+        for (circuit, _), row in zip(circuits, histogram):
+            all_counts.append({
+                format(value, '0{}b'.format(circuit.num_qubits)): int(row[value])
+                for value in np.flatnonzero(row)})
+        return all_counts
@@ -0,0 +1,379 @@
+from enum import Enum
+
+import functools
+
+import qcatsweeper.quantum_logic as ql
+
+# Click evaluation marks kept per tile in TileState.marks
+MARK_NONE = 0
+MARK_NEG_EVAL = 1  # the click didn't count, shown as a '!'
+
+
+class GameStatus(Enum):
+    PLAYING = 0
+    LOST = 1
+    WON = 2
+
+
+def _shared_write(method):
+    """
+    Makes an engine method one write of its shared_state.SharedGame, if it
+    has one, so readers in other processes never see half of it.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.shared is None:
+            return method(self, *args, **kwargs)
+        with self.shared.writing():
+            result = method(self, *args, **kwargs)
+            self.shared.publish(self.status.value, self.clicks, self.game_grid.golden_cat)
+        return result
+    return wrapper
+
+
+class GameEngine:
+    """
+    All the rules of a game of quantum catsweeper without any drawing, so it
+    can be driven by the GUI, the batch simulator or anything else.
+
+    A click is handled in two steps: `begin_click` marks the tile as clicked
+    and returns what needs to be resolved on the quantum backend, and
+    `apply_click_result` applies the outcome. `click` does both at once.
+    """
+
+    def __init__(self, grid_size=12, bomb_no=20, game_grid=None, event_log=None,
+                 hints=False, classic=False, quantum_groups=False, rng=None,
+                 shared=None):
+        """
+        params:
+        event_log: optional event_log.EventLogWriter recording every game
+        hints: keep a hints.HintEngine of where the golden cat could be
+        classic: revealed tiles show how many bombs are around them, and
+                 opening a tile with none reveals the empty area around it
+        quantum_groups: every group keeps a quantum state across its clicks,
+                        see statevector.GroupStates
+        rng: random.Random for the quantum_groups measurements
+        shared: shared_state.SharedGame to keep the board and tile state in,
+                for other processes to read, this engine is its only writer
+        """
+        self.grid_size = grid_size
+        self.bomb_no = bomb_no
+        self.event_log = event_log
+        self.track_hints = hints
+        self.classic = classic
+        self.quantum_groups = quantum_groups
+        self.rng = rng
+        self.shared = shared
+
+        # Most tiles listed one by one in dirty_tiles before a change just
+        # sets dirty_all, e.g. the GUI sets it to the tiles on screen
+        self.max_dirty_tiles = None
+        self.reset(game_grid)
+
+    @_shared_write
+    def reset(self, game_grid=None):
+        self.status = GameStatus.PLAYING
+        self.clicks = 0
+        self.clicked_group_times = {}
+        self.reveal_groups = {}
+
+        # Tiles whose appearance changed since the last take_dirty_tiles,
+        # dirty_all instead when more changed than max_dirty_tiles
+        self.dirty_tiles = set()
+        self.dirty_all = False
+
+        if game_grid is None:
+            game_grid = ql.new_game_grid(self.grid_size, bomb_no=self.bomb_no)
+
+        # Clicked / revealed bits and evaluation marks for every tile
+        from qcatsweeper.state import TileState
+        if self.shared is None:
+            self.tiles = TileState(game_grid.height, game_grid.width)
+        else:
+            # The board is copied in once, everything after is done in place
+            from qcatsweeper.board import Board
+            if game_grid.codes.shape != self.shared.codes.shape:
+                raise ValueError('A {}x{} board does not fit the shared game'.format(
+                    game_grid.height, game_grid.width))
+            self.shared.codes[...] = game_grid.codes
+            game_grid = Board(self.shared.codes)
+            self.tiles = TileState(game_grid.height, game_grid.width, self.shared.clicked,
+                                   self.shared.revealed, self.shared.marks)
+        self.game_grid = game_grid
+
+        self.set_hints(self.track_hints)
+
+        self.neighbours = None
+        if self.classic:
+            from qcatsweeper.classic import NeighbourCounts
+            self.neighbours = NeighbourCounts(game_grid)
+
+        self.group_states = None
+        if self.quantum_groups:
+            from qcatsweeper.statevector import GroupStates
+            self.group_states = GroupStates(rng=self.rng)
+
+        if self.event_log is not None:
+            self.event_log.game(game_grid, self.bomb_no)
+            if self.classic:
+                self.event_log.classic()
+
+    def set_hints(self, enabled):
+        """
+        Starts or stops keeping `hints`, every resolved click costs a pass
+        over the board while they are kept. Hints started mid game begin
+        from the tiles already face up, the cat moves before that are lost.
+        """
+        self.track_hints = enabled
+        self.hints = None
+        if enabled:
+            from qcatsweeper.hints import HintEngine
+            self.hints = HintEngine(self.game_grid.height, self.game_grid.width)
+            self.hints.exclude(self.tiles.revealed_mask().reshape(-1).nonzero()[0])
+
+    @property
+    def golden_cat_x(self):
+        return self.game_grid.golden_cat[1]
+
+    @property
+    def golden_cat_y(self):
+        return self.game_grid.golden_cat[0]
+
+    def take_dirty_tiles(self):
+        """
+        returns the dirty tiles and clears them along with dirty_all, read
+        dirty_all first
+        """
+        dirty, self.dirty_tiles = self.dirty_tiles, set()
+        self.dirty_all = False
+        return dirty
+
+    def _mark_dirty(self, flat_positions):
+        if self.max_dirty_tiles is not None and len(flat_positions) > self.max_dirty_tiles:
+            self.dirty_all = True
+            return
+        rows, cols = divmod(flat_positions, self.game_grid.width)
+        self.dirty_tiles.update(zip(rows.tolist(), cols.tolist()))
+
+    def in_bounds(self, row, col):
+        return 0 <= row < self.grid_size and 0 <= col < self.grid_size
+
+    def is_clicked(self, row, col):
+        return self.tiles.is_clicked(row, col)
+
+    def is_revealed(self, row, col):
+        """
+        Whether the tile is face up, clicked or part of a revealed group.
+        """
+        return self.tiles.is_revealed(row, col)
+
+    def tile_label(self, row, col):
+        """
+        What string to display on a revealed tile, the group number or in
+        classic mode the number of bombs around it
+        """
+        if self.neighbours is not None:
+            count = self.neighbours.get(row, col)
+            label = str(count) if count else ''
+        else:
+            label = str(abs(self.game_grid[row][col].value))
+        if self.tiles.get_mark(row, col) == MARK_NEG_EVAL:
+            label += '!'
+        return label
+
+    def is_clickable(self, row, col):
+        return self.status is GameStatus.PLAYING and self.in_bounds(row, col) and \
+            not self.tiles.is_revealed(row, col)
+
+    @_shared_write
+    def begin_click(self, row, col):
+        """
+        returns (clicked_tile, num_clicks) to resolve with ql.onclick, or None
+        when the click is ignored or needs no quantum decision
+        """
+        if not self.is_clickable(row, col):
+            return None
+
+        if self.event_log is not None:
+            self.event_log.click(row, col)
+
+        clicked_tile = self.game_grid[row][col]
+        self.tiles.set_clicked(row, col)
+        self.tiles.set_revealed(row, col)
+        self.dirty_tiles.add((row, col))
+        self.clicks += 1
+
+        if clicked_tile is ql.TileItems.GOLDEN_CAT:
+            self.status = GameStatus.WON
+            if self.event_log is not None:
+                self.event_log.end(self.status, self.clicks)
+            return None
+
+        if self.hints is not None:
+            self.hints.exclude_tile(row, col)
+
+        if self.neighbours is not None and clicked_tile is not ql.TileItems.BOMB_UNEXPLODED:
+            self.flood_reveal(row, col)
+
+        if clicked_tile is ql.TileItems.BLANKS:
+            return None
+
+        if clicked_tile not in self.clicked_group_times:
+            self.clicked_group_times[clicked_tile] = 1
+
+        return clicked_tile, self.clicked_group_times[clicked_tile]
+
+    @_shared_write
+    def apply_click_result(self, row, col, clicked_tile, reveal_state):
+        self.dirty_tiles.add((row, col))
+        if self.event_log is not None:
+            self.event_log.result(row, col, reveal_state)
+
+        # Move golden cat away from item
+        if reveal_state is ql.TileItems.NEG_EVAL:
+            self._observed_move(row, col, -1)
+
+        # Move golden cat towards item
+        if reveal_state is ql.TileItems.POS_EVAL or \
+                reveal_state is ql.TileItems.REVEAL_GROUP or \
+                reveal_state is ql.TileItems.BOMB_DEFUSED:
+            self._observed_move(row, col, 1)
+
+        if reveal_state is None or reveal_state is ql.TileItems.NEG_EVAL:
+            self.tiles.set_mark(row, col, MARK_NEG_EVAL)
+            return
+
+        if reveal_state is ql.TileItems.POS_EVAL:
+            self.clicked_group_times[clicked_tile] += 1
+
+        if reveal_state is ql.TileItems.REVEAL_GROUP:
+            self.reveal_groups[clicked_tile] = ql.TileItems.REVEAL_GROUP
+            positions = self.game_grid.flat_positions(clicked_tile)
+            self.tiles.reveal_many(positions)
+            if self.hints is not None:
+                self.hints.exclude(positions)
+            self._mark_dirty(positions)
+
+        # When bomb doesn't explode it turns into blank
+        if reveal_state is ql.TileItems.BOMB_DEFUSED:
+            self.game_grid[row][col] = ql.TileItems.BOMB_DEFUSED
+            if self.neighbours is not None:
+                self.neighbours.remove_bomb(row, col)
+                self._counts_changed(row, col)
+                self.flood_reveal(row, col)
+
+        if reveal_state is ql.TileItems.BOMB_EXPLODED:
+            self.game_grid[row][col] = ql.TileItems.BOMB_EXPLODED
+            self.status = GameStatus.LOST
+            if self.event_log is not None:
+                self.event_log.end(self.status, self.clicks)
+
+    def resolves_locally(self, clicked_tile, num_clicks):
+        """
+        Whether the click is decided by the game's own group states rather
+        than the quantum backend, see resolve_click
+        """
+        return self.group_states is not None and \
+            self.group_states.handles(clicked_tile, num_clicks)
+
+    def resolve_click(self, clicked_tile, num_clicks):
+        """
+        returns the reveal state of a click from the group states in
+        quantum_groups mode, from ql.onclick otherwise
+        """
+        if self.resolves_locally(clicked_tile, num_clicks):
+            return self.group_states.click(clicked_tile, num_clicks)
+        return ql.onclick(clicked_tile, num_clicks)
+
+    def click(self, row, col, resolve=None):
+        """
+        Clicks a tile and resolves it straight away.
+        returns the reveal state, or None if nothing was resolved
+
+        params:
+        resolve: function (clicked_tile, num_clicks) -> reveal state,
+                 resolve_click by default
+        """
+        pending = self.begin_click(row, col)
+        if pending is None:
+            return None
+
+        clicked_tile, num_clicks = pending
+        reveal_state = (resolve or self.resolve_click)(clicked_tile, num_clicks)
+        self.apply_click_result(row, col, clicked_tile, reveal_state)
+        return reveal_state
+
+    def flood_reveal(self, row, col):
+        """
+        Classic mode, reveals the empty area around a tile with no bombs
+        next to it. The golden cat is never revealed this way.
+        """
+        if self.neighbours.get(row, col) != 0:
+            return
+
+        cat_row, cat_col = self.game_grid.golden_cat
+        cat = cat_row * self.game_grid.width + cat_col
+
+        def can_reveal(positions):
+            return ~self.tiles.revealed_at(positions) & (positions != cat)
+
+        # The first position is the opened tile itself
+        positions = self.neighbours.flood(row, col, can_reveal)[1:]
+        if not len(positions):
+            return
+
+        self.tiles.reveal_many(positions)
+        if self.hints is not None:
+            self.hints.exclude(positions)
+        self._mark_dirty(positions)
+
+    def _counts_changed(self, row, col):
+        # Revealed tiles around (row, col) show a different count
+        self.dirty_tiles.update(
+            (r, c) for r in range(row - 1, row + 2) for c in range(col - 1, col + 2)
+            if self.in_bounds(r, c))
+
+    def _observed_move(self, row, col, direction):
+        # The hints see the same move the player does, before it happens
+        if self.hints is not None:
+            self.hints.observe_move(row, col, direction, self.tiles.revealed_mask())
+        self.move_golden_cat(row, col, direction)
+
+    def move_golden_cat(self, row, col, direction):
+        """
+        Moves the cat one tile towards (direction 1) or away from (-1) the
+        clicked tile, horizontally first.
+        """
+        offset_x = direction if self.golden_cat_x < col else -direction
+        offset_x = 0 if self.golden_cat_x == col else offset_x
+
+        offset_y = direction if self.golden_cat_y < row else -direction
+        offset_y = 0 if self.golden_cat_y == row else offset_y
+
+        # Move cat if the destination position is not clicked
+        if not self.swap_golden_cat_with(self.golden_cat_x + offset_x, self.golden_cat_y):
+            self.swap_golden_cat_with(
+                self.golden_cat_x, self.golden_cat_y + offset_y)
+
+    def swap_golden_cat_with(self, x, y):
+        if x == self.golden_cat_x and y == self.golden_cat_y:
+            return False
+
+        if x >= 0 and x < self.grid_size and y >= 0 and y < self.grid_size:
+            # Clicked tiles and revealed groups are both face up
+            if not self.tiles.is_revealed(y, x):
+                cat_y, cat_x = self.game_grid.golden_cat
+                _tmp = self.game_grid[y][x]
+                self.game_grid[y][x] = ql.TileItems.GOLDEN_CAT
+                self.game_grid[cat_y][cat_x] = _tmp
+                if self.neighbours is not None and _tmp is ql.TileItems.BOMB_UNEXPLODED:
+                    self.neighbours.remove_bomb(y, x)
+                    self.neighbours.add_bomb(cat_y, cat_x)
+                    self._counts_changed(y, x)
+                    self._counts_changed(cat_y, cat_x)
+                self.dirty_tiles.add((y, x))
+                self.dirty_tiles.add((cat_y, cat_x))
+                if self.event_log is not None:
+                    self.event_log.cat_move(cat_y, cat_x, y, x)
+                return True
+        return False
@@ -0,0 +1,230 @@
+from array import array
+
+import hashlib
+import os
+import random
+import threading
+
+
+class EntropyProvider:
+    """
+    Source of random 16 bit numbers for board generation. Providers are only
+    ever called from EntropyPool, in bulk.
+    """
+    name = None
+
+    def read_uint16(self, count):
+        raise NotImplementedError
+
+
+def _bytes_to_uint16(data):
+    numbers = array('H')
+    numbers.frombytes(data[:len(data) - len(data) % 2])
+    return numbers
+
+
+class CSPRNGProvider(EntropyProvider):
+    """
+    Local SHAKE-256 generator in counter mode, seeded once from the OS.
+    """
+    name = 'csprng'
+
+    def __init__(self, seed=None):
+        self._seed = seed if seed is not None else os.urandom(32)
+        self._counter = 0
+
+    def read_uint16(self, count):
+        block = hashlib.shake_256(
+            self._seed + self._counter.to_bytes(16, 'little')).digest(count * 2)
+        self._counter += 1
+        return _bytes_to_uint16(block)
+
+
+class OSEntropyProvider(EntropyProvider):
+    name = 'os'
+
+    def read_uint16(self, count):
+        return _bytes_to_uint16(os.urandom(count * 2))
+
+
+class FileProvider(EntropyProvider):
+    """
+    Replays a recorded dump of raw random bytes, e.g. saved QRNG output,
+    wrapping around at the end of the file.
+    """
+    name = 'file'
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        if len(self._data) < 2:
+            raise ValueError('Entropy dump {} is too small'.format(path))
+        self._pos = 0
+
+    def read_uint16(self, count):
+        wanted = count * 2
+        chunks = []
+        while wanted > 0:
+            chunk = self._data[self._pos:self._pos + wanted]
+            if len(chunk) < 2:
+                self._pos = 0
+                continue
+            chunk = chunk[:len(chunk) - len(chunk) % 2]
+            chunks.append(chunk)
+            wanted -= len(chunk)
+            self._pos += len(chunk)
+        return _bytes_to_uint16(b''.join(chunks))
+
+
+class ANUProvider(EntropyProvider):
+    """
+    ANU quantum random number generator, needs network access.
+    """
+    name = 'anu'
+
+    # The ANU service hands out at most this many numbers per request
+    max_request = 1024
+
+    def read_uint16(self, count):
+        import quantumrandom as qr
+
+        numbers = []
+        while len(numbers) < count:
+            length = min(self.max_request, count - len(numbers))
+            numbers.extend(qr.get_data(data_type='uint16', array_length=length))
+        return numbers
+
+
+class SeededProvider(EntropyProvider):
+    """
+    Deterministic provider, the same seed always gives the same boards.
+    """
+    name = 'seeded'
+
+    def __init__(self, seed=0):
+        self._rng = random.Random(seed)
+
+    def read_uint16(self, count):
+        return [self._rng.getrandbits(16) for _ in range(count)]
+
+
+PROVIDERS = {
+    CSPRNGProvider.name: CSPRNGProvider,
+    OSEntropyProvider.name: OSEntropyProvider,
+    FileProvider.name: FileProvider,
+    ANUProvider.name: ANUProvider,
+    SeededProvider.name: SeededProvider,
+}
+
+
+class EntropyPool:
+    """
+    Large local buffer of random uint16s. A background thread refills it in
+    bulk from the provider whenever it drops below `low_water`, so drawing
+    numbers normally never touches the provider.
+
+    The buffer is an array('H') read from `_start` on, a draw hands out a
+    slice of it and a refill drops what was read and appends in one go.
+    """
+
+    def __init__(self, provider, size=8192, low_water=2048, background=True):
+        """
+        params:
+        provider: EntropyProvider to refill from
+        size: number of uint16s to fill the buffer up to
+        low_water: a refill is triggered when the buffer drops below this
+        background: refill from a background thread, otherwise refills
+                    happen synchronously when the buffer runs dry
+        """
+        self.provider = provider
+        self.size = size
+        self.low_water = low_water
+        self.background = background
+
+        self._buffer = array('H')
+        self._start = 0
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # Number of draws that had to wait on the provider
+        self.stalls = 0
+        self.refills = 0
+
+        if background:
+            self._thread = threading.Thread(
+                target=self._run, name='EntropyPool', daemon=True)
+            self._thread.start()
+            self._wanted.set()
+
+    def __len__(self):
+        return len(self._buffer) - self._start
+
+    def stop(self):
+        """
+        Ends the background thread, later draws refill synchronously.
+        """
+        if self._thread is not None:
+            self._stopped.set()
+            self._wanted.set()
+            self._thread.join()
+            self._thread = None
+        self.background = False
+
+    def refill(self, wanted=0):
+        """
+        params:
+        wanted: numbers a draw is waiting for, the buffer is filled up to
+                the larger of this and `size`
+        """
+        with self._refill_lock:
+            missing = max(self.size, wanted) - len(self)
+            if missing <= 0:
+                return
+            numbers = self.provider.read_uint16(missing)
+            with self._lock:
+                del self._buffer[:self._start]
+                self._start = 0
+                self._buffer.extend(numbers)
+                self.refills += 1
+
+    def get_uint16(self, count):
+        """
+        returns an array('H') of `count` numbers
+        """
+        numbers = array('H')
+        while len(numbers) < count:
+            with self._lock:
+                take = min(count - len(numbers), len(self))
+                numbers.extend(self._buffer[self._start:self._start + take])
+                self._start += take
+            if len(numbers) < count:
+                self.stalls += 1
+                self.refill(count - len(numbers))
+
+        if self.background and len(self) < self.low_water:
+            self._wanted.set()
+        return numbers
+
+    def get_bits(self, bits):
+        """
+        A random integer of `bits` bits built out of uint16s.
+        """
+        value = 0
+        for number in self.get_uint16((bits + 15) // 16):
+            value = (value << 16) | number
+        return value >> (-bits % 16)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wanted.wait()
+            self._wanted.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.refill()
+            except Exception as e:
+                # Draws fall back to synchronous refills until it recovers
+                print('Entropy refill failed: {}'.format(e))
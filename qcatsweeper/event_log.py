@@ -0,0 +1,205 @@
+"""
+Append-only binary log of game events (the starting board, clicks, click
+outcomes, golden cat moves and how each game ended) and a headless replay
+of it through GameEngine.
+
+    python -m qcatsweeper.event_log games.qlog
+
+Every record is a one byte type followed by a fixed little-endian payload,
+a game record is followed by the board as one int8 TileItems value per
+tile, row by row.
+"""
+from collections import namedtuple
+
+import argparse
+import json
+import mmap
+import struct
+import time
+
+from qcatsweeper.engine import GameEngine, GameStatus
+
+import qcatsweeper.quantum_logic as ql
+
+
+MAGIC = b'QCEL'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+
+GAME = 1
+CLICK = 2
+RESULT = 3
+CAT_MOVE = 4
+END = 5
+CLASSIC = 6
+
+# Payloads, including the type byte
+RECORDS = {
+    GAME: struct.Struct('<BHHI'),  # height, width, bomb_no
+    CLICK: struct.Struct('<BII'),  # row, col
+    RESULT: struct.Struct('<BIIb'),  # row, col, outcome
+    CAT_MOVE: struct.Struct('<BIIII'),  # from row, col, to row, col
+    END: struct.Struct('<BBI'),  # GameStatus value, clicks
+    CLASSIC: struct.Struct('<B'),  # right after the game record of a classic game
+}
+
+# Outcome byte of a click that failed to resolve, every TileItems value
+# fits in an int8 above it
+OUTCOME_NONE = -128
+
+_TILES = {tile.value: tile for tile in ql.TileItems}
+
+ReplayStats = namedtuple('ReplayStats', 'games clicks won lost seconds')
+
+
+class EventLogWriter:
+    """
+    Writes the events of every game played on an engine, set it as the
+    engine's `event_log`. Writes are buffered, call `close` (or `flush`) to
+    get everything on disk.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self._file = open(path, 'ab', buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def game(self, board, bomb_no):
+        self._file.write(RECORDS[GAME].pack(GAME, board.height, board.width, bomb_no))
+        self._file.write(board.codes.tobytes())
+
+    def classic(self):
+        self._file.write(RECORDS[CLASSIC].pack(CLASSIC))
+
+    def click(self, row, col):
+        self._file.write(RECORDS[CLICK].pack(CLICK, row, col))
+
+    def result(self, row, col, reveal_state):
+        outcome = OUTCOME_NONE if reveal_state is None else reveal_state.value
+        self._file.write(RECORDS[RESULT].pack(RESULT, row, col, outcome))
+
+    def cat_move(self, from_row, from_col, to_row, to_col):
+        self._file.write(RECORDS[CAT_MOVE].pack(
+            CAT_MOVE, from_row, from_col, to_row, to_col))
+
+    def end(self, status, clicks):
+        self._file.write(RECORDS[END].pack(END, status.value, clicks))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_events(buf):
+    """
+    Yields (type, fields) for every record in a log held in a buffer (bytes
+    or an mmap). A game's fields end with the bytes of its board.
+    """
+    magic, version = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a catsweeper event log')
+    if version != VERSION:
+        raise ValueError('Unsupported event log version: {}'.format(version))
+
+    offset = HEADER.size
+    end = len(buf)
+    while offset < end:
+        kind = buf[offset]
+        record = RECORDS.get(kind)
+        if record is None:
+            raise ValueError('Unknown event type {} at offset {}'.format(kind, offset))
+
+        fields = record.unpack_from(buf, offset)[1:]
+        offset += record.size
+        if kind == GAME:
+            cells = fields[0] * fields[1]
+            fields = fields + (buf[offset:offset + cells],)
+            offset += cells
+        yield kind, fields
+
+
+def replay(path, verify=True):
+    """
+    Replays every game in a log through a GameEngine, with the logged
+    outcomes instead of the quantum backend.
+
+    params:
+    path: event log file
+    verify: check the logged cat moves and game ends against the engine's
+    returns ReplayStats
+    """
+    import numpy as np
+    from qcatsweeper.board import Board
+
+    games = clicks = won = lost = 0
+    started = time.perf_counter()
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        engine = None
+        pending = {}
+        for kind, fields in read_events(buf):
+            if kind == GAME:
+                height, width, bomb_no, cells = fields
+                board = Board(np.frombuffer(cells, dtype=np.int8).reshape(height, width).copy())
+                if engine is None:
+                    engine = GameEngine(width, bomb_no, game_grid=board)
+                else:
+                    engine.grid_size, engine.bomb_no = width, bomb_no
+                    engine.classic = False
+                    engine.reset(board)
+                pending = {}
+                games += 1
+
+            elif kind == CLASSIC:
+                # Nothing has been clicked yet, start the game over in classic mode
+                engine.classic = True
+                engine.reset(engine.game_grid)
+
+            elif kind == CLICK:
+                row, col = fields
+                pending[(row, col)] = engine.begin_click(row, col)
+                clicks += 1
+
+            elif kind == RESULT:
+                row, col, outcome = fields
+                clicked_tile, _ = pending.pop((row, col))
+                engine.apply_click_result(
+                    row, col, clicked_tile,
+                    None if outcome == OUTCOME_NONE else _TILES[outcome])
+
+            elif kind == CAT_MOVE:
+                if verify and engine.game_grid.golden_cat != (fields[2], fields[3]):
+                    raise ValueError('Replay diverged in game {}: cat at {}, logged {}'.format(
+                        games, engine.game_grid.golden_cat, fields[2:]))
+
+            elif kind == END:
+                status, logged_clicks = GameStatus(fields[0]), fields[1]
+                if verify and (engine.status, engine.clicks) != (status, logged_clicks):
+                    raise ValueError('Replay diverged in game {}: {} after {} clicks, '
+                                     'logged {} after {}'.format(
+                                         games, engine.status, engine.clicks,
+                                         status, logged_clicks))
+                won += status is GameStatus.WON
+                lost += status is GameStatus.LOST
+
+    return ReplayStats(games, clicks, won, lost, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a catsweeper event log')
+    parser.add_argument('path')
+    parser.add_argument('--no-verify', action='store_true',
+                        help="don't check cat moves and game ends against the log")
+    args = parser.parse_args()
+
+    stats = replay(args.path, verify=not args.no_verify)
+    report = stats._asdict()
+    report['games_per_second'] = stats.games / stats.seconds if stats.seconds else 0.0
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
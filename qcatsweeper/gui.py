@@ -1,12 +1,37 @@
 from enum import Enum
 from functools import partial
 
+from qcatsweeper import profiling
+from qcatsweeper.board_factory import BoardFactory
+from qcatsweeper.click_resolver import ClickResolver
+from qcatsweeper.engine import GameEngine, GameStatus
+from qcatsweeper.viewport import Viewport
+
 import qcatsweeper.quantum_logic as ql
 import math
 import random
 import pyxel
 
 
+# Revealed tiles drawn as a coloured square: (square colour, label colour)
+TILE_COLOURS = {
+    ql.TileItems.BLANKS: (6, None),
+    ql.TileItems.GROUP1: (3, 7),
+    ql.TileItems.GROUP2: (11, 0),
+    ql.TileItems.GROUP3: (9, 0),
+    ql.TileItems.GROUP4: (10, 0),
+    ql.TileItems.GROUP5: (13, 0),
+    ql.TileItems.GROUP6: (1, 7),
+}
+
+# Colour of sprite tiles when zoomed out too far to draw the sprite
+TILE_SPRITE_COLOURS = {
+    ql.TileItems.GOLDEN_CAT: 10,
+    ql.TileItems.BOMB_DEFUSED: 7,
+    ql.TileItems.BOMB_EXPLODED: 8,
+}
+
+
 class GameState(Enum):
     INTRO = 0
     HELP = 1
@@ -22,12 +47,22 @@ def is_within(x, y, pos):
 
 
 class QuantumCatsweeperApp:
-    def __init__(self, width=153, height=170, debugging=False):
+    def __init__(self, width=153, height=170, debugging=False, max_pending_clicks=4,
+                 click_batch_size=1, grid_size=12, bomb_no=20, board_queue_depth=2,
+                 event_log=None, classic=False, quantum_groups=False, shared=None):
         # Initialize game state
         self.game_state = GameState.INTRO
 
         self.debugging = debugging
 
+        # Frame time, FPS and pending jobs in the top bar, toggled with P
+        self.show_overlay = False
+
+        # Outline on the tile most likely to be the golden cat, toggled with H
+        self.show_hint = False
+        self._hint_tile = None
+        self._hint_version = None
+
         self._main_cat_asset = 0
         self._exploding_cat_asset = 1
         self._golden_cat_asset = 2
@@ -39,19 +74,50 @@ class QuantumCatsweeperApp:
         self._width = width
         self._height = height
 
-        self._grid_size = 12
+        self._grid_size = grid_size
+        self._bomb_no = bomb_no
         self._grid_start_x = 5
         self._grid_start_y = 22
         self._grid_draw_size = 12
 
-        self.game_grid = []
-        self.game_grid_evaled = {}  # What string to display
+        # Boards bigger than the screen scroll with the arrow keys and zoom
+        # with - and =
+        self.viewport = Viewport(
+            grid_size, grid_size, self._grid_start_x, self._grid_start_y,
+            width - self._grid_start_x - 4, height - self._grid_start_y - 4)
+
+        # Revealed tiles drawn from an image: (image, flip, transparent colour)
+        self._tile_sprites = {
+            ql.TileItems.GOLDEN_CAT: (self._golden_cat_asset, 1, 4),
+            ql.TileItems.BOMB_DEFUSED: (self._main_cat_asset, 1, 4),
+            ql.TileItems.BOMB_EXPLODED: (self._main_cat_asset, -1, 8),
+        }
+
+        # The play screen is only redrawn in full when this is set, otherwise
+        # just the tiles that changed are drawn over the previous frame
+        self._redraw_all = True
+        self._drawn_state = None
+
+        # Game rules and per-game state, created on the first reset_game
+        self.engine = None
+        self._event_log = event_log
+        # Tiles show how many bombs are around them, see GameEngine
+        self._classic = classic
+        # Groups keep their quantum state between clicks, see GameEngine
+        self._quantum_groups = quantum_groups
+        # Board and tile state in shared memory for other processes to read
+        self._shared = shared
         self.elapsed_frames = 0
-        self.clicked_tiles = {}
-        self.clicked_group_times = {}
-        self.reveal_groups = {}
-        self.golden_cat_x = -1
-        self.golden_cat_y = -1
+
+        # Boards for the next games, generated while the player is on the
+        # intro or end screens
+        self.board_factory = BoardFactory(
+            lambda: ql.new_game_grid(grid_size, bomb_no=bomb_no),
+            depth=board_queue_depth)
+
+        # Clicks waiting on the quantum backend, resolved off the frame loop
+        self.click_resolver = ClickResolver(
+            max_in_flight=max_pending_clicks, batch_size=click_batch_size)
 
         self._play_real_button_pos = self.pyxel_button_centered(
             'Play', 100)
@@ -87,10 +153,16 @@ class QuantumCatsweeperApp:
 
         pyxel.run(self.update, self.draw)
 
+    @profiling.timed('update')
     def update(self):
+        profiling.frame()
+
         if pyxel.btnp(pyxel.KEY_Q):
             pyxel.quit()
 
+        if pyxel.btnp(pyxel.KEY_P):
+            self.show_overlay = not self.show_overlay
+
         if self.game_state == GameState.INTRO:
             self.handle_intro_events()
 
@@ -98,7 +170,9 @@ class QuantumCatsweeperApp:
             self.handle_help_events()
 
         elif self.game_state == GameState.PLAYING_REAL:
+            self.apply_resolved_clicks()
             self.handle_playing_events()
+            self.update_hint()
 
         elif self.game_state == GameState.LOST:
             self.handle_lostgame_events()
@@ -106,8 +180,14 @@ class QuantumCatsweeperApp:
         elif self.game_state == GameState.WON:
             self.handle_wongame_events()
 
+    @profiling.timed('draw')
     def draw(self):
-        self.clear_assets()
+        redraw_all = self._redraw_all or self.game_state != GameState.PLAYING_REAL or \
+            self._drawn_state != GameState.PLAYING_REAL
+        self._drawn_state = self.game_state
+
+        if redraw_all:
+            self.clear_assets()
 
         if self.game_state == GameState.INTRO:
             self.draw_introscreen()
@@ -116,7 +196,7 @@ class QuantumCatsweeperApp:
             self.draw_helpscreen()
 
         elif self.game_state == GameState.PLAYING_REAL:
-            self.draw_playscreen()
+            self.draw_playscreen(redraw_all)
 
         elif self.game_state == GameState.LOST:
             self.draw_lostscreen()
@@ -124,6 +204,13 @@ class QuantumCatsweeperApp:
         elif self.game_state == GameState.WON:
             self.draw_winscreen()
 
+        if self.show_overlay:
+            self.draw_overlay()
+
+        # Started after the first frame so board generation (and numpy)
+        # doesn't hold up the intro screen
+        self.board_factory.start()
+
     def clear_assets(self):
         pyxel.cls(self._main_cat_asset)
 
@@ -157,7 +244,28 @@ class QuantumCatsweeperApp:
                 pyxel.stop(self._losing_bg)
                 pyxel.play(self._playing_bg, [2, 3], loop=True)
 
+    def handle_viewport_events(self):
+        moved = False
+        if pyxel.btnp(pyxel.KEY_LEFT, 10, 2):
+            moved |= self.viewport.scroll(0, -1)
+        if pyxel.btnp(pyxel.KEY_RIGHT, 10, 2):
+            moved |= self.viewport.scroll(0, 1)
+        if pyxel.btnp(pyxel.KEY_UP, 10, 2):
+            moved |= self.viewport.scroll(-1, 0)
+        if pyxel.btnp(pyxel.KEY_DOWN, 10, 2):
+            moved |= self.viewport.scroll(1, 0)
+        if pyxel.btnp(pyxel.KEY_MINUS):
+            moved |= self.viewport.zoom(1)
+        if pyxel.btnp(pyxel.KEY_EQUAL):
+            moved |= self.viewport.zoom(-1)
+
+        if moved:
+            self._redraw_all = True
+            self.engine.max_dirty_tiles = self.viewport.visible_rows * self.viewport.visible_cols
+
     def handle_playing_events(self):
+        self.handle_viewport_events()
+
         if pyxel.btnp(pyxel.KEY_LEFT_BUTTON):
             mouse_within = partial(is_within, pyxel.mouse_x, pyxel.mouse_y)
 
@@ -167,82 +275,78 @@ class QuantumCatsweeperApp:
                 pyxel.play(self._main_bg, [0, 1], loop=True)
 
             # If user is clicking
-            if pyxel.mouse_x > self._grid_start_x and pyxel.mouse_y > self._grid_start_y:
-                row, col = self.get_grid_row_col_from_xy(
-                    pyxel.mouse_x, pyxel.mouse_y)
+            tile = self.get_grid_row_col_from_xy(pyxel.mouse_x, pyxel.mouse_y)
+            if tile is not None:
+                row, col = tile
 
-                if row < 0 or row >= self._grid_size or col < 0 or col >= self._grid_size:
+                if not self.engine.is_clickable(row, col):
                     return
 
-                clicked_tile = self.game_grid[row][col]
-
-                if ((row, col) not in self.clicked_tiles) and clicked_tile not in self.reveal_groups:
-                    self.clicked_tiles[(row, col)] = True
-
-                    if clicked_tile is ql.TileItems.BLANKS:
-                        return
+                # Too many clicks in flight, or this group is still waiting
+                # on its previous click (its click count would be stale)
+                if not self.click_resolver.can_submit() or \
+                        self.click_resolver.is_group_pending(self.engine.game_grid[row][col]):
+                    return
 
-                    if clicked_tile is ql.TileItems.GOLDEN_CAT:
-                        self.game_state = GameState.WON
-                        pyxel.stop(self._playing_bg)
-                        pyxel.play(self._main_bg, [0, 1], loop=True)
+                pending = self.engine.begin_click(row, col)
 
-                    if clicked_tile not in self.clicked_group_times:
-                        self.clicked_group_times[clicked_tile] = 1
+                if self.engine.status is GameStatus.WON:
+                    self.game_state = GameState.WON
+                    pyxel.stop(self._playing_bg)
+                    pyxel.play(self._main_bg, [0, 1], loop=True)
+                    return
 
-                    # Call quantum computer to see if we reveal of nah
-                    reveal_state = ql.onclick(
-                        clicked_tile, self.clicked_group_times[clicked_tile]
-                    )
-
-                    # Move golden cat away from item
-                    if reveal_state is ql.TileItems.NEG_EVAL:
-                        offset_x = -1 if self.golden_cat_x < col else 1
-                        offset_x = 0 if self.golden_cat_x == col else offset_x
-
-                        offset_y = -1 if self.golden_cat_y < row else 1
-                        offset_y = 0 if self.golden_cat_y == row else offset_y
-
-                        # Move cat if the destination position is not clicked
-                        if not self.swap_golden_cat_with(self.golden_cat_x + offset_x, self.golden_cat_y):
-                            self.swap_golden_cat_with(
-                                self.golden_cat_x, self.golden_cat_y + offset_y)
-
-                    if reveal_state is ql.TileItems.POS_EVAL or \
-                            reveal_state is ql.TileItems.REVEAL_GROUP or \
-                            reveal_state is ql.TileItems.BOMB_DEFUSED:
-                        # TODO: Move golden cat towards item
-                        offset_x = 1 if self.golden_cat_x < col else -1
-                        offset_x = 0 if self.golden_cat_x == col else offset_x
-
-                        offset_y = 1 if self.golden_cat_y < row else -1
-                        offset_y = 0 if self.golden_cat_y == row else offset_y
-
-                        # Move cat if the destination position is not clicked
-                        if not self.swap_golden_cat_with(self.golden_cat_x + offset_x, self.golden_cat_y):
-                            self.swap_golden_cat_with(
-                                self.golden_cat_x, self.golden_cat_y + offset_y)
-
-                    if reveal_state is None or reveal_state is ql.TileItems.NEG_EVAL:
-                        self.game_grid_evaled[(row, col)] = str(
-                            abs(clicked_tile.value)) + '!'
+                if pending is not None:
+                    clicked_tile, num_clicks = pending
+                    # A few amplitudes to update, no need for the worker pool
+                    if self.engine.resolves_locally(clicked_tile, num_clicks):
+                        reveal_state = self.engine.resolve_click(clicked_tile, num_clicks)
+                        self.engine.apply_click_result(row, col, clicked_tile, reveal_state)
                         return
 
-                    if reveal_state is ql.TileItems.POS_EVAL:
-                        self.clicked_group_times[clicked_tile] += 1
-
-                    if reveal_state is ql.TileItems.REVEAL_GROUP:
-                        self.reveal_groups[clicked_tile] = ql.TileItems.REVEAL_GROUP
+                    # Call quantum computer to see if we reveal of nah
+                    self.click_resolver.submit((row, col), clicked_tile, num_clicks)
 
-                    # When bomb doesn't explode it turns into blank
-                    if reveal_state is ql.TileItems.BOMB_DEFUSED:
-                        self.game_grid[row][col] = ql.TileItems.BOMB_DEFUSED
+    def apply_resolved_clicks(self):
+        for (row, col), clicked_tile, reveal_state in self.click_resolver.completed():
+            self.engine.apply_click_result(row, col, clicked_tile, reveal_state)
 
-                    if reveal_state is ql.TileItems.BOMB_EXPLODED:
-                        self.game_grid[row][col] = ql.TileItems.BOMB_EXPLODED
-                        self.game_state = GameState.LOST
-                        pyxel.stop(self._playing_bg)
-                        pyxel.play(self._losing_bg, 4, loop=True)
+            if self.engine.status is GameStatus.LOST:
+                self.game_state = GameState.LOST
+                pyxel.stop(self._playing_bg)
+                pyxel.play(self._losing_bg, 4, loop=True)
+                self.click_resolver.cancel_all()
+                return
+
+    def update_hint(self):
+        if pyxel.btnp(pyxel.KEY_H):
+            self.show_hint = not self.show_hint
+            self._hint_version = None
+        # The hint engine is only kept up to date while it is shown
+        if self.engine.track_hints != self.show_hint:
+            self.engine.set_hints(self.show_hint)
+
+        hint_tile = None
+        if self.show_hint:
+            hints = self.engine.hints
+            pending = self.click_resolver.pending_clicks()
+            version = (hints.version, tuple(pos for pos, _, _ in pending))
+            if version == self._hint_version:
+                return
+
+            revealed = self.engine.tiles.revealed_mask()
+            # Where the cat is expected to be once the clicks in flight land
+            weights = None
+            for (row, col), clicked_tile, num_clicks in pending:
+                weights = hints.predict(row, col, clicked_tile, num_clicks, revealed, weights)
+            hint_tile = hints.best_click(revealed, weights)
+            self._hint_version = version
+
+        if hint_tile != self._hint_tile:
+            for tile in (self._hint_tile, hint_tile):
+                if tile is not None:
+                    self.engine.dirty_tiles.add(tile)
+            self._hint_tile = hint_tile
 
     def handle_help_events(self):
         if pyxel.btnp(pyxel.KEY_LEFT_BUTTON):
@@ -282,85 +386,87 @@ class QuantumCatsweeperApp:
         pyxel.text(60, 8, 'GAMEOVER', 8)
 
     def draw_grid(self):
-        for row in range(len(self.game_grid)):
-            for col in range(len(self.game_grid[row])):
-                _x, _y = self.get_grid_xy_from_row_col(col, row)
-
-                cur_tile = self.game_grid[row][col]
-
-                if self.clicked_tiles.get((row, col), -1) == True or \
-                        self.reveal_groups.get(cur_tile) == ql.TileItems.REVEAL_GROUP:
-
-                    display_tile_text = "_empty"
-
-                    if (row, col) in self.game_grid_evaled:
-                        display_tile_text = self.game_grid_evaled[(row, col)]
-                    else:
-                        display_tile_text = str(
-                            abs(self.game_grid[row][col].value))
-
-                    if cur_tile is ql.TileItems.BLANKS:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 6)
-
-                    elif cur_tile is ql.TileItems.GROUP1:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 3)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 7)
-
-                    elif cur_tile is ql.TileItems.GROUP2:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 11)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 0)
-
-                    elif cur_tile is ql.TileItems.GROUP3:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 9)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 0)
-
-                    elif cur_tile is ql.TileItems.GROUP4:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 10)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 0)
-
-                    elif cur_tile is ql.TileItems.GROUP5:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 13)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 0)
-
-                    elif cur_tile is ql.TileItems.GROUP6:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 1)
-                        pyxel.text(_x + 2, _y + 2, display_tile_text, 7)
-
-                    # Golden Cat
-                    elif cur_tile is ql.TileItems.GOLDEN_CAT:
-                        pyxel.blt(_x, _y, self._golden_cat_asset,
-                                  0, 0, self._grid_draw_size - 1, self._grid_draw_size - 1, 4)
-
-                    # Bomb defused
-                    elif cur_tile is ql.TileItems.BOMB_DEFUSED:
-                        pyxel.blt(_x, _y, self._main_cat_asset,
-                                  0, 0, self._grid_draw_size - 1, self._grid_draw_size - 1, 4)
-
-                    # Bomb exploded
-                    elif cur_tile is ql.TileItems.BOMB_EXPLODED:
-                        pyxel.blt(_x, _y, self._main_cat_asset,
-                                  0, 0, self._grid_draw_size - 1, -1 * (self._grid_draw_size - 1), 8)
-
-                else:
-                    # Golden Cat (debug)
-                    if cur_tile is ql.TileItems.GOLDEN_CAT and self.debugging:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 1)
-                        pyxel.text(_x + 2, _y + 2, 'G', 12)
-
-                    else:
-                        pyxel.rect(_x, _y, _x + self._grid_draw_size -
-                                   2, _y - 2 + self._grid_draw_size, 5)
-
-    def draw_playscreen(self):
-        self.draw_grid()
+        first_row, last_row, first_col, last_col = self.viewport.visible_range()
+        for row in range(first_row, last_row):
+            for col in range(first_col, last_col):
+                self.draw_tile(row, col)
+
+    def draw_dirty_tiles(self):
+        redraw_all = self.engine.dirty_all
+        dirty = self.engine.take_dirty_tiles()
+        # Pending tiles blink
+        dirty.update(self.click_resolver.pending_positions())
+
+        # e.g. a big group was revealed, cheaper to draw what's on screen
+        if redraw_all or len(dirty) > self.viewport.visible_rows * self.viewport.visible_cols:
+            self.draw_grid()
+            return
+
+        for row, col in dirty:
+            if self.viewport.is_visible(row, col):
+                self.draw_tile(row, col)
+
+    def draw_tile(self, row, col):
+        engine = self.engine
+        size = self.viewport.tile_size
+        _x, _y = self.get_grid_xy_from_row_col(col, row)
+        _x2 = _x + max(size - 2, 0)
+        _y2 = _y + max(size - 2, 0)
+
+        cur_tile = engine.game_grid[row][col]
+
+        # Waiting on the quantum backend
+        if self.click_resolver.is_pending((row, col)):
+            pyxel.rect(_x, _y, _x2, _y2, 7)
+            if size >= self._grid_draw_size:
+                pyxel.text(_x + 2, _y + 2, '?', pyxel.frame_count % 16)
+
+        elif engine.is_revealed(row, col):
+            colours = TILE_COLOURS.get(cur_tile)
+
+            if colours is not None:
+                pyxel.rect(_x, _y, _x2, _y2, colours[0])
+                # Blanks only have a label in classic mode
+                label_colour = colours[1] if colours[1] is not None or not self._classic else 0
+                if label_colour is not None and size >= self._grid_draw_size:
+                    display_tile_text = engine.tile_label(row, col)
+                    pyxel.text(_x + 2, _y + 2, display_tile_text, label_colour)
+
+            elif size < self._grid_draw_size:
+                pyxel.rect(_x, _y, _x2, _y2,
+                           TILE_SPRITE_COLOURS.get(cur_tile, self._main_cat_asset))
+
+            else:
+                # Sprites are partly transparent, clear whatever was here
+                pyxel.rect(_x, _y, _x2, _y2, self._main_cat_asset)
+
+                sprite = self._tile_sprites.get(cur_tile)
+                if sprite is not None:
+                    img, flip, colkey = sprite
+                    pyxel.blt(_x, _y, img, 0, 0, size - 1, flip * (size - 1), colkey)
+
+        # Golden Cat (debug)
+        elif cur_tile is ql.TileItems.GOLDEN_CAT and self.debugging:
+            pyxel.rect(_x, _y, _x2, _y2, 1)
+            if size >= self._grid_draw_size:
+                pyxel.text(_x + 2, _y + 2, 'G', 12)
+
+        else:
+            pyxel.rect(_x, _y, _x2, _y2, 5)
+
+        if (row, col) == self._hint_tile:
+            pyxel.rectb(_x, _y, _x2, _y2, 10)
+
+    def draw_playscreen(self, redraw_all=True):
+        if redraw_all:
+            self.engine.take_dirty_tiles()
+            self.draw_grid()
+            self._redraw_all = False
+        else:
+            self.draw_dirty_tiles()
+
+            # Top bar is redrawn every frame for the timer
+            pyxel.rect(0, 0, self._width - 1, self._grid_start_y - 2, self._main_cat_asset)
 
         # Top bar stuff
         self.pyxel_button('Back', 5, 5)
@@ -377,6 +483,12 @@ class QuantumCatsweeperApp:
 
         self.elapsed_frames = self.elapsed_frames + 1
 
+    def draw_overlay(self):
+        # Sits in the top bar, which is cleared every frame on every screen
+        frame_time, fps = profiling.frame_stats()
+        pyxel.text(5, 15, '{:.1f}MS {:.0f}FPS {} JOBS'.format(
+            frame_time * 1e3, fps, len(self.click_resolver)), 11)
+
     def draw_helpscreen(self):
         self.pyxel_text_centered(20, 'HELP', pyxel.frame_count % 16)
         # Information
@@ -387,6 +499,7 @@ class QuantumCatsweeperApp:
         self.pyxel_text_centered(80, 'a ! then your click doesn\'t', 7)
         self.pyxel_text_centered(90, 'count. Find the golden cat', 7)
         self.pyxel_text_centered(100, 'to win!', 7)
+        self.pyxel_text_centered(115, 'Press H for a hint', 7)
         self.pyxel_button_centered('Back', 135)
 
     def draw_introscreen(self):
@@ -435,44 +548,30 @@ class QuantumCatsweeperApp:
         return self.pyxel_button(text, x, y)
 
     def get_grid_xy_from_row_col(self, x, y):
-        gx = self._grid_start_x + (self._grid_draw_size * x)
-        gy = self._grid_start_y + (self._grid_draw_size * y)
+        gx, gy = self.viewport.tile_to_screen(y, x)
         return gx, gy
 
     def get_grid_row_col_from_xy(self, x, y):
-        col = (x - self._grid_start_x) / self._grid_draw_size
-        row = (y - self._grid_start_y) / self._grid_draw_size
-        return int(row), int(col)
+        # None when the position isn't over a visible tile
+        return self.viewport.screen_to_tile(x, y)
 
     #### Game State ####
-    def swap_golden_cat_with(self, x, y):
-        if x == self.golden_cat_x and y == self.golden_cat_y:
-            return False
-
-        if x >= 0 and x < self._grid_size and y >= 0 and y < self._grid_size:
-            if (y, x) not in self.clicked_tiles:
-                if self.game_grid[y][x] not in self.reveal_groups:
-                    _tmp = self.game_grid[y][x]
-                    self.game_grid[y][x] = ql.TileItems.GOLDEN_CAT
-                    self.game_grid[self.golden_cat_y][self.golden_cat_x] = _tmp
-
-                    self.golden_cat_x = x
-                    self.golden_cat_y = y
-                    return True
-        return False
-
     def reset_game(self):
+        self.click_resolver.cancel_all()
+        ql.cancel_pending_jobs()
         self.elapsed_frames = 0
-        self.clicked_group_times = {}
-        self.clicked_tiles = {}
-        self.reveal_groups = {}
-
-        self.game_grid_evaled = {}
-        self.game_grid = ql.new_game_grid(self._grid_size, bomb_no=20)
-
-        for r in range(self._grid_size):
-            for c in range(self._grid_size):
-                if self.game_grid[r][c] == ql.TileItems.GOLDEN_CAT:
-                    self.golden_cat_x = c
-                    self.golden_cat_y = r
-                    break
+        self._redraw_all = True
+
+        game_grid = self.board_factory.get()
+        if self.engine is None:
+            self.engine = GameEngine(self._grid_size, bomb_no=self._bomb_no,
+                                     game_grid=game_grid, event_log=self._event_log,
+                                     hints=self.show_hint, classic=self._classic,
+                                     quantum_groups=self._quantum_groups,
+                                     shared=self._shared)
+        else:
+            self.engine.reset(game_grid)
+        # Bigger changes than a screenful are drawn as a full redraw
+        self.engine.max_dirty_tiles = self.viewport.visible_rows * self.viewport.visible_cols
+        self._hint_tile = None
+        self._hint_version = None
@@ -0,0 +1,159 @@
+import numpy as np
+
+from qcatsweeper import backends
+
+import qcatsweeper.quantum_logic as ql
+
+
+# Which way the cat moves after each reveal state, see
+# GameEngine.apply_click_result: 1 towards the click, -1 away, 0 stays
+MOVES = {
+    ql.TileItems.NEG_EVAL: -1,
+    ql.TileItems.POS_EVAL: 1,
+    ql.TileItems.REVEAL_GROUP: 1,
+    ql.TileItems.BOMB_DEFUSED: 1,
+}
+
+
+def outcome_moves(clicked_tile, num_clicks, shots=None):
+    """
+    returns [(probability, move)] of the possible outcomes of a click, from
+    the majority vote probabilities of its circuit
+    """
+    kind = ql.click_kind(clicked_tile, num_clicks)
+    if kind not in ql.CLICK_CIRCUITS:
+        return [(1.0, 0)]
+
+    circuit, index = ql.CLICK_CIRCUITS[kind]
+    p_one = backends.majority_prob_one(backends.prob_one(circuit, index), shots or ql.shots)
+    return [(p_one, MOVES.get(ql.click_outcome(kind, 1), 0)),
+            (1 - p_one, MOVES.get(ql.click_outcome(kind, 0), 0))]
+
+
+def _axis_moves(n, centre, move):
+    """
+    Along one axis, tiles before the centre move by `move` and tiles after
+    it by -`move`, the centre itself doesn't move.
+    returns [(first, last + 1, offset)] of the tiles whose move stays on
+    the board
+    """
+    moves = []
+    for start, stop, d in ((0, centre, move), (centre + 1, n, -move)):
+        start, stop = max(start, -d), min(stop, n - d)
+        if start < stop:
+            moves.append((start, stop, d))
+    return moves
+
+
+class HintEngine:
+    """
+    Probability of the golden cat being on each tile, as seen by the player.
+    It starts uniform and is updated on every click: a clicked tile that
+    wasn't the cat is ruled out, and every move of the cat is applied to the
+    whole distribution with the same rule as GameEngine.move_golden_cat.
+
+    The distribution is kept as unnormalized `weights` and their `total`.
+    Ruling tiles out only touches those tiles, a cat move is a handful of
+    vectorized operations over the board and normalizes as it goes.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.weights = np.full((rows, cols), 1.0 / (rows * cols))
+        self.total = 1.0
+
+        # Bumped on every update, so drawing code knows when to look again
+        self.version = 0
+
+    @property
+    def probabilities(self):
+        return self.weights / self.total if self.total > 0 else self.weights.copy()
+
+    def exclude(self, flat_positions):
+        """
+        Rules out tiles that are known not to hold the cat.
+        """
+        flat = self.weights.reshape(-1)
+        self.total -= flat[flat_positions].sum()
+        flat[flat_positions] = 0.0
+        self.version += 1
+
+    def exclude_tile(self, row, col):
+        self.total -= self.weights[row, col]
+        self.weights[row, col] = 0.0
+        self.version += 1
+
+    def moved(self, row, col, move, revealed, weights=None):
+        """
+        returns the (unnormalized) distribution after the cat moves once
+        towards (move 1) or away from (-1) a click at (row, col)
+
+        params:
+        revealed: bool array of the face up tiles, the cat never moves there
+        weights: distribution to move, the current one by default
+        """
+        p = self.weights if weights is None else weights
+        if move == 0:
+            return p
+
+        # Tiles whose cat would move sideways, then the rest that would move
+        # up or down, the same order as move_golden_cat
+        col_moves = _axis_moves(self.cols, col, move)
+        row_moves = _axis_moves(self.rows, row, move)
+        horizontal = np.zeros((self.rows, self.cols), dtype=bool)
+        for start, stop, d in col_moves:
+            horizontal[:, start:stop] = ~revealed[:, start + d:stop + d]
+        vertical = np.zeros((self.rows, self.cols), dtype=bool)
+        for start, stop, d in row_moves:
+            vertical[start:stop, :] = ~revealed[start + d:stop + d, :]
+        vertical &= ~horizontal
+
+        result = np.where(horizontal | vertical, 0.0, p)
+        moving = np.where(horizontal, p, 0.0)
+        for start, stop, d in col_moves:
+            result[:, start + d:stop + d] += moving[:, start:stop]
+        moving = np.where(vertical, p, 0.0)
+        for start, stop, d in row_moves:
+            result[start + d:stop + d, :] += moving[start:stop, :]
+        return result
+
+    def observe_move(self, row, col, move, revealed):
+        self.weights = self.moved(row, col, move, revealed)
+        self.total = self.weights.sum()
+        if self.total > 0:
+            self.weights /= self.total
+            self.total = 1.0
+        self.version += 1
+
+    def predict(self, row, col, clicked_tile, num_clicks, revealed, weights=None):
+        """
+        returns the expected (unnormalized) distribution once a click that
+        is still waiting on the backend is resolved, weighting each possible
+        move by the probability of the outcome behind it
+
+        params:
+        weights: distribution to start from, the current one by default, so
+                 several pending clicks can be chained
+        """
+        expected = None
+        for probability, move in outcome_moves(clicked_tile, num_clicks):
+            part = probability * self.moved(row, col, move, revealed, weights)
+            expected = part if expected is None else expected + part
+        return expected
+
+    def best_click(self, revealed, weights=None):
+        """
+        returns the face down tile most likely to be the cat, None if there
+        is no face down tile left
+
+        params:
+        weights: distribution to pick from, the current one by default
+        """
+        if weights is None:
+            weights = self.weights
+        flat = np.where(revealed, -1.0, weights).ravel()
+        best = int(np.argmax(flat))
+        if flat[best] < 0:
+            return None
+        return divmod(best, self.cols)
@@ -0,0 +1,433 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from qcatsweeper import backends
+from qcatsweeper import profiling
+
+import random
+import threading
+import time
+
+
+# Job states reported by a RemoteService
+QUEUED = 'QUEUED'
+RUNNING = 'RUNNING'
+DONE = 'DONE'
+ERROR = 'ERROR'
+CANCELLED = 'CANCELLED'
+
+
+class RemoteJobError(Exception):
+    """
+    A remote job failed, was cancelled or didn't finish within the latency
+    budget.
+    """
+
+
+class RemoteService:
+    """
+    A remote device that runs jobs of circuits asynchronously. Every method
+    may be called from the job manager thread only.
+    """
+
+    def submit(self, circuits, shots):
+        """
+        params:
+        circuits: list of (circuit, measured qubit indexes)
+        returns a job id
+        """
+        raise NotImplementedError
+
+    def status(self, job_id):
+        """
+        returns one of QUEUED, RUNNING, DONE, ERROR, CANCELLED
+        """
+        raise NotImplementedError
+
+    def result(self, job_id):
+        """
+        returns the counts of every circuit of a DONE job, in order
+        """
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        raise NotImplementedError
+
+
+class QiskitRemoteService(RemoteService):
+    """
+    Runs jobs through a backends.QiskitBackend on a worker thread. This
+    version of qiskit only has a blocking run, so cancelling a running job
+    only drops its result.
+    """
+
+    def __init__(self, backend, max_workers=2):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._next_id = 0
+
+    def submit(self, circuits, shots):
+        self._next_id += 1
+        self._futures[self._next_id] = self._executor.submit(
+            self.backend._execute, circuits, shots)
+        return self._next_id
+
+    def status(self, job_id):
+        future = self._futures[job_id]
+        if future.cancelled():
+            return CANCELLED
+        if not future.done():
+            return RUNNING if future.running() else QUEUED
+        return ERROR if future.exception() is not None else DONE
+
+    def result(self, job_id):
+        return self._futures.pop(job_id).result()
+
+    def cancel(self, job_id):
+        future = self._futures.pop(job_id, None)
+        if future is not None:
+            future.cancel()
+
+
+class FakeRemoteService(RemoteService):
+    """
+    Local stand-in for a remote device with injectable latency and failures,
+    jobs are run on a local CountsBackend once their latency has passed.
+    """
+
+    def __init__(self, backend=None, latency=0.5, submit_failure_rate=0.0,
+                 job_failure_rate=0.0, seed=None):
+        """
+        params:
+        backend: backends.CountsBackend producing the counts, a noiseless
+                 emulator by default
+        latency: seconds from submission to a finished job, or a function
+                 (random.Random) -> seconds
+        submit_failure_rate: probability that a submission raises
+        job_failure_rate: probability that a job ends in ERROR
+        seed: seed for the latencies and failures
+        """
+        if backend is None:
+            backend = backends.BACKENDS['emulator']('ideal', seed=seed)
+        self.backend = backend
+        self.latency = latency
+        self.submit_failure_rate = submit_failure_rate
+        self.job_failure_rate = job_failure_rate
+        self._rng = random.Random(seed)
+        self._jobs = {}
+        self._next_id = 0
+
+        self.submitted = 0
+        self.cancelled = 0
+        self.polls = 0
+
+    def submit(self, circuits, shots):
+        if self._rng.random() < self.submit_failure_rate:
+            raise RemoteJobError('Submission failed')
+
+        latency = self.latency(self._rng) if callable(self.latency) else self.latency
+        failed = self._rng.random() < self.job_failure_rate
+        self._next_id += 1
+        self._jobs[self._next_id] = {
+            'ready': time.monotonic() + latency,
+            'circuits': circuits,
+            'shots': shots,
+            'failed': failed,
+            'cancelled': False,
+        }
+        self.submitted += 1
+        return self._next_id
+
+    def status(self, job_id):
+        self.polls += 1
+        job = self._jobs[job_id]
+        if job['cancelled']:
+            return CANCELLED
+        if time.monotonic() < job['ready']:
+            return RUNNING
+        return ERROR if job['failed'] else DONE
+
+    def result(self, job_id):
+        job = self._jobs.pop(job_id)
+        return self.backend._execute(job['circuits'], job['shots'])
+
+    def cancel(self, job_id):
+        if job_id in self._jobs:
+            self._jobs[job_id]['cancelled'] = True
+            self.cancelled += 1
+
+
+class _Request:
+    def __init__(self, circuits, shots):
+        self.circuits = circuits
+        self.shots = shots
+        self.created = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class _Job:
+    def __init__(self, requests, shots, poll_interval):
+        self.requests = requests
+        self.shots = shots
+        self.circuits = [c for request in requests for c in request.circuits]
+        self.job_id = None
+        self.attempts = 0
+        self.interval = poll_interval
+        self.next_poll = time.monotonic()
+
+
+class RemoteBackend(backends.CountsBackend):
+    """
+    Runs circuits on a RemoteService without ever blocking a caller for
+    longer than `latency_budget`. A single manager thread submits the jobs
+    and polls them with exponential backoff. Requests arriving within
+    `coalesce_window` of each other share one job. Failed jobs are retried.
+
+    Callers that run out of budget, whose job keeps failing or that are
+    cancelled get their outcome from the local `fallback` engine. Jobs
+    nobody waits for any more are cancelled on the service.
+    """
+    name = 'remote'
+
+    def __init__(self, service, fallback=None, latency_budget=30.0,
+                 poll_interval=0.05, max_poll_interval=2.0, backoff=2.0,
+                 coalesce_window=0.02, retries=2, pack=True):
+        """
+        params:
+        service: the RemoteService to run jobs on
+        fallback: local OutcomeBackend used when the remote one doesn't
+                  deliver, the analytic engine by default
+        latency_budget: seconds a caller waits before falling back
+        poll_interval: first wait between two status polls of a job
+        max_poll_interval: longest wait between two status polls
+        backoff: factor the poll interval grows by after every poll
+        coalesce_window: seconds to wait for more requests to join a job
+        retries: resubmissions of a failed job before giving up on it
+        pack: see backends.CountsBackend
+        """
+        super().__init__(pack)
+        self.service = service
+        self.fallback = fallback or backends.AnalyticBackend()
+        self.latency_budget = latency_budget
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.coalesce_window = coalesce_window
+        self.retries = retries
+
+        self._requests = deque()
+        self._jobs = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name='RemoteBackend', daemon=True)
+        self._thread.start()
+
+        self.jobs_submitted = 0
+        self.requests_coalesced = 0
+        self.retried = 0
+        self.fallbacks = 0
+        self.cancelled_jobs = 0
+
+    #### Callers ####
+
+    def _execute(self, circuits, shots):
+        request = _Request(circuits, shots)
+        with self._condition:
+            self._requests.append(request)
+            self._condition.notify()
+
+        if not request.done.wait(self.latency_budget):
+            # The manager cancels the job once nobody is waiting for it
+            with self._condition:
+                request.abandoned = True
+                self._condition.notify()
+            raise RemoteJobError('No result within {}s'.format(self.latency_budget))
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def counts(self, circuit, index, shots):
+        try:
+            return super().counts(circuit, index, shots)
+        except RemoteJobError:
+            self.fallbacks += 1
+            return self.fallback.counts(circuit, index, shots)
+
+    def majority(self, circuit, index, shots):
+        return self.majority_batch([(circuit, index)], shots)[0]
+
+    def majority_batch(self, decisions, shots):
+        try:
+            return super().majority_batch(decisions, shots)
+        except RemoteJobError:
+            self.fallbacks += 1
+            return self.fallback.majority_batch(decisions, shots)
+
+    def cancel_all(self):
+        """
+        Drops every queued and running request, their callers fall back
+        straight away and their jobs are cancelled.
+        """
+        with self._condition:
+            for request in self._requests:
+                request.abandoned = True
+                request.finish(error=RemoteJobError('Cancelled'))
+            self._requests.clear()
+            for job in list(self._jobs):
+                for request in job.requests:
+                    request.abandoned = True
+                    request.finish(error=RemoteJobError('Cancelled'))
+            self._condition.notify()
+
+    def stop(self):
+        self.cancel_all()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'jobs_submitted': self.jobs_submitted,
+            'requests_coalesced': self.requests_coalesced,
+            'retried': self.retried,
+            'fallbacks': self.fallbacks,
+            'cancelled_jobs': self.cancelled_jobs,
+            'queued': len(self._requests),
+            'running': len(self._jobs),
+        }
+
+    #### Manager thread ####
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    break
+                timeout = self._next_wakeup()
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    break
+
+                now = time.monotonic()
+                batch = []
+                if self._requests and now - self._requests[0].created >= self.coalesce_window:
+                    batch = list(self._requests)
+                    self._requests.clear()
+
+            by_shots = {}
+            for request in batch:
+                by_shots.setdefault(request.shots, []).append(request)
+            for shots, requests in by_shots.items():
+                job = _Job(requests, shots, self.poll_interval)
+                self.requests_coalesced += len(requests) - 1
+                self._jobs.append(job)
+                self._submit(job)
+
+            now = time.monotonic()
+            for job in list(self._jobs):
+                if all(request.abandoned for request in job.requests):
+                    self._drop(job, cancel=True)
+                elif job.next_poll <= now:
+                    self._poll(job)
+
+        for job in list(self._jobs):
+            self._drop(job, cancel=True)
+
+    def _next_wakeup(self):
+        """
+        seconds until something is due, None when there is nothing to do
+        """
+        wakeups = [job.next_poll for job in self._jobs]
+        if self._requests:
+            wakeups.append(self._requests[0].created + self.coalesce_window)
+        if not wakeups:
+            return None
+        return max(0.0, min(wakeups) - time.monotonic())
+
+    def _submit(self, job):
+        job.attempts += 1
+        try:
+            with profiling.timer('remote.submit'):
+                job.job_id = self.service.submit(job.circuits, job.shots)
+            self.jobs_submitted += 1
+            job.interval = self.poll_interval
+            job.next_poll = time.monotonic() + job.interval
+        except Exception as e:
+            self._failed(job, e)
+
+    def _failed(self, job, error):
+        job.job_id = None
+        if job.attempts > self.retries:
+            self._drop(job)
+            for request in job.requests:
+                request.finish(error=RemoteJobError(str(error)))
+            return
+
+        # Resubmitted on the next poll
+        self.retried += 1
+        job.interval = min(job.interval * self.backoff, self.max_poll_interval)
+        job.next_poll = time.monotonic() + job.interval
+
+    def _poll(self, job):
+        if job.job_id is None:
+            self._submit(job)
+            return
+
+        try:
+            status = self.service.status(job.job_id)
+        except Exception as e:
+            # A failed poll is treated like a slow job
+            profiling.log('remote.poll_failed', str(e))
+            status = RUNNING
+
+        if status == DONE:
+            self._drop(job)
+            try:
+                all_counts = self.service.result(job.job_id)
+            except Exception as e:
+                for request in job.requests:
+                    request.finish(error=RemoteJobError(str(e)))
+                return
+            profiling.record('remote.job', time.monotonic() - min(
+                request.created for request in job.requests))
+
+            start = 0
+            for request in job.requests:
+                end = start + len(request.circuits)
+                request.finish(result=all_counts[start:end])
+                start = end
+
+        elif status == ERROR:
+            self._failed(job, RemoteJobError('Job {} failed'.format(job.job_id)))
+
+        elif status == CANCELLED:
+            self._drop(job)
+            for request in job.requests:
+                request.finish(error=RemoteJobError('Job {} was cancelled'.format(job.job_id)))
+
+        else:
+            job.interval = min(job.interval * self.backoff, self.max_poll_interval)
+            job.next_poll = time.monotonic() + job.interval
+
+    def _drop(self, job, cancel=False):
+        if job in self._jobs:
+            self._jobs.remove(job)
+        if cancel and job.job_id is not None:
+            try:
+                self.service.cancel(job.job_id)
+                self.cancelled_jobs += 1
+            except Exception as e:
+                profiling.log('remote.cancel_failed', str(e))
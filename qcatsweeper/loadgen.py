@@ -0,0 +1,189 @@
+"""
+Load generator for qcatsweeper.server: plays many sessions at once over a
+few connections and reports clicks per second and click latencies.
+
+    python -m qcatsweeper.loadgen --sessions 2000 --connections 20 --duration 10
+    python -m qcatsweeper.loadgen --spawn  # with a server in this process
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+import qcatsweeper.quantum_logic as ql
+
+
+class Connection:
+    """
+    One client connection, requests are pipelined and matched to their
+    replies by id.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._waiting = {}
+        self._task = asyncio.ensure_future(self._read_replies())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def request(self, **message):
+        message['id'] = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[message['id']] = future
+        self._writer.write(json.dumps(message).encode() + b'\n')
+        await self._writer.drain()
+        return await future
+
+    async def _read_replies(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self._waiting.pop(reply.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(reply)
+
+        for future in self._waiting.values():
+            future.set_exception(ConnectionError('Connection closed'))
+
+    def close(self):
+        self._task.cancel()
+        self._writer.close()
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.games = 0
+        self.busy = 0
+        self.errors = 0
+
+    def report(self, seconds, sessions, connections):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e3
+
+        return {
+            'sessions': sessions,
+            'connections': connections,
+            'seconds': seconds,
+            'clicks': len(latencies),
+            'clicks_per_second': len(latencies) / seconds if seconds else 0.0,
+            'p50_ms': percentile(0.5),
+            'p90_ms': percentile(0.9),
+            'p99_ms': percentile(0.99),
+            'max_ms': latencies[-1] * 1e3 if latencies else 0.0,
+            'games_finished': self.games,
+            'busy': self.busy,
+            'errors': self.errors,
+        }
+
+
+async def play_session(connection, stats, deadline, rng, size=12, bomb_no=20):
+    """
+    Plays games on one session until the deadline, clicking random tiles
+    that it hasn't seen revealed.
+    """
+    while time.monotonic() < deadline:
+        reply = await connection.request(op='new', size=size, bombs=bomb_no)
+        if not reply['ok']:
+            stats.busy += reply.get('busy', False)
+            stats.errors += not reply.get('busy', False)
+            await asyncio.sleep(0.1)
+            continue
+        session = reply['session']
+
+        unrevealed = [(r, c) for r in range(size) for c in range(size)]
+        rng.shuffle(unrevealed)
+        revealed = set()
+        status = 'PLAYING'
+        while status == 'PLAYING' and unrevealed and time.monotonic() < deadline:
+            row, col = unrevealed.pop()
+            if (row, col) in revealed:
+                continue
+
+            started = time.perf_counter()
+            reply = await connection.request(op='click', session=session, row=row, col=col)
+            if not reply['ok']:
+                stats.errors += 1
+                break
+            stats.latencies.append(time.perf_counter() - started)
+            status = reply['status']
+            revealed.update((r, c) for r, c, label in reply['tiles'] if label is not None)
+
+        if status != 'PLAYING':
+            stats.games += 1
+        await connection.request(op='close', session=session)
+
+
+async def run_load(host, port, sessions, connections, duration, seed=0):
+    connections = [await Connection.open(host, port) for _ in range(connections)]
+    stats = LoadStats()
+    rng = random.Random(seed)
+    started = time.monotonic()
+    deadline = started + duration
+    try:
+        await asyncio.gather(*[
+            play_session(connections[i % len(connections)], stats, deadline,
+                         random.Random(rng.random()))
+            for i in range(sessions)])
+    finally:
+        for connection in connections:
+            connection.close()
+    return stats.report(time.monotonic() - started, sessions, len(connections))
+
+
+async def run_with_server(sessions, connections, duration, tick, seed=0):
+    from qcatsweeper.server import GameServer, OutcomeService
+
+    server = GameServer(OutcomeService(tick=tick))
+    listener = await server.start('127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    try:
+        report = await run_load('127.0.0.1', port, sessions, connections, duration, seed)
+        report['batches'] = server.outcomes.batches
+        report['clicks_per_batch'] = \
+            server.outcomes.resolved / server.outcomes.batches if server.outcomes.batches else 0.0
+        return report
+    finally:
+        listener.close()
+        await server.outcomes.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantum catsweeper server load generator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', action='store_true',
+                        help='run the server in this process with the analytic backend')
+    parser.add_argument('--tick', type=float, default=0.005,
+                        help='batch tick of the spawned server')
+    args = parser.parse_args()
+
+    if args.spawn:
+        ql.set_backend('analytic')
+        report = asyncio.run(run_with_server(
+            args.sessions, args.connections, args.duration, args.tick, args.seed))
+    else:
+        report = asyncio.run(run_load(
+            args.host, args.port, args.sessions, args.connections, args.duration, args.seed))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
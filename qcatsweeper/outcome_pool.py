@@ -0,0 +1,133 @@
+from collections import deque
+
+from qcatsweeper import profiling
+
+import threading
+
+
+class OutcomePool:
+    """
+    Keeps a buffer of ready measurement outcomes for every kind of click
+    circuit. Clicks are served from the buffer and a background thread tops
+    up every buffer that drops below `low_water` back to `high_water`, using
+    one batched backend execution for all of them.
+    """
+
+    def __init__(self, get_backend, circuits, shots, low_water=8, high_water=32):
+        """
+        params:
+        get_backend: function returning the backends.OutcomeBackend to use
+        circuits: dict of kind -> (circuit, measured qubit index)
+        shots: shots per outcome
+        low_water: a refill is triggered when a buffer drops below this
+        high_water: refills top buffers up to this size
+        """
+        if low_water > high_water:
+            raise ValueError('low_water must not be above high_water')
+
+        self._get_backend = get_backend
+        self.circuits = circuits
+        self.shots = shots
+        self.low_water = low_water
+        self.high_water = high_water
+
+        self._buffers = {kind: deque() for kind in circuits}
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refilled_outcomes = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='OutcomePool', daemon=True)
+            self._thread.start()
+            self._wanted.set()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._wanted.set()
+            self._thread.join()
+            self._thread = None
+
+    def get(self, kind):
+        buffer = self._buffers[kind]
+        try:
+            outcome = buffer.popleft()
+            with self._lock:
+                self.hits += 1
+        except IndexError:
+            circuit, index = self.circuits[kind]
+            outcome = self._get_backend().majority(circuit, index, self.shots)
+            with self._lock:
+                self.misses += 1
+
+        if len(buffer) < self.low_water:
+            self._wanted.set()
+        return outcome
+
+    def clear(self):
+        # Needed when the backend changes, buffered outcomes came from the old one
+        with self._refill_lock:
+            for buffer in self._buffers.values():
+                buffer.clear()
+        self._wanted.set()
+
+    def refill(self):
+        """
+        Tops up every buffer below low_water in one batched execution.
+        """
+        with self._refill_lock:
+            kinds = []
+            decisions = []
+            for kind, buffer in self._buffers.items():
+                if len(buffer) < self.low_water:
+                    missing = self.high_water - len(buffer)
+                    kinds.extend([kind] * missing)
+                    decisions.extend([self.circuits[kind]] * missing)
+
+            if not decisions:
+                return 0
+
+            with profiling.timer('outcome_pool.refill'):
+                outcomes = self._get_backend().majority_batch(decisions, self.shots)
+            for kind, outcome in zip(kinds, outcomes):
+                self._buffers[kind].append(outcome)
+
+            with self._lock:
+                self.refills += 1
+                self.refilled_outcomes += len(outcomes)
+            return len(outcomes)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'refills': self.refills,
+                'refilled_outcomes': self.refilled_outcomes,
+                'buffered': {kind: len(b) for kind, b in self._buffers.items()},
+            }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wanted.wait()
+            self._wanted.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.refill()
+            except Exception as e:
+                # Clicks fall back to direct backend calls until it recovers
+                print('Outcome pool refill failed: {}'.format(e))
+                self._stopped.wait(1.0)
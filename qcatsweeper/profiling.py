@@ -0,0 +1,162 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import json
+import threading
+import time
+
+
+# Histogram bucket upper bounds in seconds, 1us doubling up to about a minute
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** i for i in range(27))
+
+# Values passed to log() are printed as well when this is set
+verbose = False
+
+_lock = threading.Lock()
+_histograms = {}
+_logs = {}
+_frame_times = deque(maxlen=60)
+_last_frame = None
+
+
+class Histogram:
+    """
+    Latency histogram with log spaced buckets, cheap enough to record every
+    frame. Percentiles are the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        wanted = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= wanted:
+                return BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        ms = 1e3
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * ms if self.count else 0.0,
+            'min_ms': (self.min or 0.0) * ms,
+            'max_ms': (self.max or 0.0) * ms,
+            'p50_ms': self.percentile(0.5) * ms,
+            'p90_ms': self.percentile(0.9) * ms,
+            'p99_ms': self.percentile(0.99) * ms,
+            'buckets_ms': {'{:g}'.format(bound * ms): n for bound, n
+                           in zip(BUCKET_BOUNDS, self.buckets) if n},
+        }
+
+
+def record(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.record(seconds)
+
+
+@contextmanager
+def timer(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """
+    Decorator recording every call of the function under `name`.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def frame():
+    """
+    Marks the start of a frame, the time between two calls is the frame time.
+    """
+    global _last_frame
+    now = time.perf_counter()
+    if _last_frame is not None:
+        _frame_times.append(now - _last_frame)
+        record('frame', now - _last_frame)
+    _last_frame = now
+
+
+def frame_stats():
+    """
+    returns (average frame time in seconds, frames per second) over the
+    last 60 frames
+    """
+    frame_times = list(_frame_times)
+    if not frame_times:
+        return 0.0, 0.0
+    average = sum(frame_times) / len(frame_times)
+    return average, 1 / average if average else 0.0
+
+
+def log(name, value, keep=100):
+    """
+    Keeps the last `keep` values logged under `name`, for things like the raw
+    measurement counts that are too noisy for stdout.
+    """
+    with _lock:
+        values = _logs.get(name)
+        if values is None:
+            values = _logs[name] = deque(maxlen=keep)
+        values.append(value)
+    if verbose:
+        print('{}: {}'.format(name, value))
+
+
+def snapshot():
+    with _lock:
+        return {
+            'timers': {name: h.summary() for name, h in sorted(_histograms.items())},
+            'logs': {name: list(values) for name, values in sorted(_logs.items())},
+        }
+
+
+def export(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True, default=str)
+
+
+def reset():
+    global _last_frame
+    with _lock:
+        _histograms.clear()
+        _logs.clear()
+        _frame_times.clear()
+        _last_frame = None
@@ -1,11 +1,10 @@
-from qiskit import QuantumProgram
 from enum import Enum
-from qcatsweeper import qconfig
+from qcatsweeper import backends
+from qcatsweeper import entropy
+from qcatsweeper import profiling
+from qcatsweeper.backends import Circuit, h_gate, u3_gate
 
-import qiskit
 import math
-import random
-import quantumrandom as qr
 
 
 class TileItems(Enum):
@@ -38,124 +37,340 @@ device = 'local_qasm_simulator'
 if real_device:
     device = 'ibmqx4'
 
-Q_program = QuantumProgram()
-qiskit.register(qconfig.APItoken, qconfig.config["url"])
-
-
-def get_one_or_zero(grid_script, q, c, index):
-    global Q_program
-    # measuring qubit and finding which value has the most outcomes
-    grid_script.measure(q[index], c[index])
-    results = Q_program.execute(
-        ["gridScript"], backend=device, shots=shots, timeout=1800)
-    re = results.get_counts("gridScript")
-    d1 = list(map(lambda x: (x[0], x[1], x[0].count('0')), re.items()))
-    d2 = sorted(d1, key=lambda x: x[2], reverse=True)
-    
-    print(d2)    
-    if d2[0][1] > d2[1][1]:
-        return 0
-    return 1
-
-
-def new_game_grid(l, bomb_no=20):
-    game_grid = [[TileItems.BLANKS for i in range(l)] for j in range(l)]
-
-    # construct groups of numbers for tiles
-    _cur = 0
-    _index = [TileItems.GROUP1, TileItems.GROUP2, TileItems.GROUP3,
-              TileItems.GROUP4, TileItems.GROUP5, TileItems.GROUP6]
-    random.shuffle(_index)
-    _groups = [[random.randint(0, 1) for i in range(l)] for i in range(l)]
-
-    for y in range(0, l, 4):
-        for x in range(0, l, 6):
-            for _y in range(y, y+4):
-                for _x in range(x, x+6):
-                    if _groups[_y][_x] >= 1:
-                        game_grid[_y][_x] = _index[_cur]
-            _cur += 1
-
-    # ANU quantum random number generator to generate 20 bomb positions
-    bomb_xy = qr.get_data(data_type='uint16', array_length=bomb_no * 2)
-    bomb_xy = list(map(lambda x: x % l, bomb_xy))
-    # classical random number generator for debugging
-    # bomb_xy = [random.randint(0, l-1) for i in range(bomb_no * 2)]
-    bomb_xy = [bomb_xy[i:i+2] for i in range(0, bomb_no * 2, 2)]
-
-    for coord in bomb_xy:
-        if len(coord) > 0:
-            game_grid[coord[0]][coord[1]] = TileItems.BOMB_UNEXPLODED
-
-    # golden Cat
-    game_grid[random.randint(0, l-1)][random.randint(0, l-1)] = TileItems.GOLDEN_CAT
-
-    return game_grid
+# Run real device games on the local noisy emulator of `device` instead of
+# the IBM Q service, see emulator.NOISE_MODELS
+emulate_real_device = False
 
+# Offline mode only allows the local engines, see set_offline
+offline = False
 
-def onclick(clicked_tile, num_clicks):
+# The IBM Q account is registered the first time a remote device is used
+_qiskit_registered = False
+
+# The analytic engine is the default, qiskit is opt-in via set_backend
+_backend = None
+
+# Optional buffer of precomputed outcomes, see enable_outcome_pool
+_outcome_pool = None
+
+# 'fixed' always runs `shots` shots, 'sequential' stops early once the
+# majority is decided, see set_sampling
+sampling = 'fixed'
+sequential_batch_shots = 32
+sequential_confidence = 0.99
+
+_shot_stats = {'decisions': 0, 'shots': 0}
+
+# Buffered random numbers for board generation, see set_entropy_source
+_entropy_pool = None
+
+# The circuit behind every kind of click, keyed by (tile kind, num_clicks),
+# and what measuring a 1 or a 0 means for it
+CLICK_CIRCUITS = {
+    # hadamard gate applied to bomb qubit
+    ('bomb', 1): (Circuit((h_gate(0),), 5), 0),
+    # half not gate applied to the number tiles, one qubit per group size
+    ('one_click', 1): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 1),), 5), 1),
+    ('two_click', 1): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 2),), 5), 2),
+    ('two_click', 2): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 2),), 5), 2),
+    ('three_click', 1): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 3),), 5), 3),
+    ('three_click', 2): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 3),), 5), 3),
+    ('three_click', 3): (Circuit((u3_gate(0.5 * math.pi, 0.0, 0.0, 3),), 5), 3),
+}
+
+
+def set_backend(backend):
     """
     params:
-    clicked_tile: tile type of the clicked tile
-    num_click: number of times a group has been clicked
-    """    
-    q = Q_program.create_quantum_register("q", 5)
-    c = Q_program.create_classical_register("c", 5)
-    gridScript = Q_program.create_circuit("gridScript", [q], [c])
-
-    if (clicked_tile == TileItems.BOMB_UNEXPLODED):
-        # hadamard gate applied to bomb qubit
-        gridScript.h(q[0])
-        
-        # if there are more 1 hits then the bomb expodes and the game is lost
-        if get_one_or_zero(gridScript, q, c, 0) == 1:
-            return TileItems.BOMB_EXPLODED
-        return TileItems.BOMB_DEFUSED
-
-    elif (clicked_tile == TileItems.GROUP1 or clicked_tile == TileItems.GROUP2):  # 1 click
-        # half not gate applied to the 1 click number tiles
-        gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[1])
-        
-        # if more 1 hits then the whole tile group is revealed
-        if get_one_or_zero(gridScript, q, c, 1) == 1:
-            return TileItems.REVEAL_GROUP
-        return TileItems.NEG_EVAL
+    backend: a backends.OutcomeBackend instance or one of the names in
+             backends.BACKENDS ('analytic', 'qiskit', 'emulator')
+    """
+    global _backend
+    if isinstance(backend, str):
+        if backend == backends.QiskitBackend.name:
+            if offline:
+                raise ValueError('The qiskit backend is not available offline')
+            if not device.startswith('local_'):
+                register_qiskit()
+            backend = backends.QiskitBackend(device)
+        elif backend == 'emulator':
+            # The real device's noise, even when the local simulator is selected
+            backend = backends.BACKENDS[backend](
+                'ibmqx4' if device.startswith('local_') else device)
+        else:
+            backend = backends.BACKENDS[backend]()
+
+    # e.g. a job manager's thread and the jobs it is still waiting on
+    if _backend is not None and _backend is not backend:
+        _backend.stop()
+    _backend = backend
+
+    if _outcome_pool is not None:
+        _outcome_pool.clear()
+    return _backend
+
+
+def get_backend():
+    if _backend is None:
+        if real_device:
+            set_backend('emulator' if offline or emulate_real_device else 'qiskit')
+        else:
+            set_backend('analytic')
+    return _backend
+
+
+def enable_job_manager(service=None, fallback='analytic', **options):
+    """
+    Runs clicks as asynchronous jobs on a remote service, falling back to a
+    local engine when a job takes too long or fails. See
+    job_manager.RemoteBackend for the options.
+
+    params:
+    service: a job_manager.RemoteService, `device` through qiskit by default
+    fallback: local backend used when the remote one doesn't deliver
+    """
+    from qcatsweeper import job_manager
+
+    if service is None:
+        if offline:
+            raise ValueError('The qiskit backend is not available offline')
+        if not device.startswith('local_'):
+            register_qiskit()
+        service = job_manager.QiskitRemoteService(backends.QiskitBackend(device))
+    if isinstance(fallback, str):
+        fallback = backends.BACKENDS[fallback]()
+
+    return set_backend(job_manager.RemoteBackend(service, fallback, **options))
+
+
+def cancel_pending_jobs():
+    """
+    Drops every click still waiting on a remote job, e.g. when a game resets.
+    """
+    if _backend is not None:
+        _backend.cancel_all()
 
-    elif (clicked_tile == TileItems.GROUP3 or clicked_tile == TileItems.GROUP4):  # 2 clicks
-        if num_clicks == 1:
-            gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[2])
 
-            if get_one_or_zero(gridScript, q, c, 2) == 1:
-                return TileItems.POS_EVAL
-            return TileItems.NEG_EVAL
+def register_qiskit():
+    """
+    Registers the IBM Q account from qcatsweeper/qconfig.py, once. Only
+    remote devices need it, qiskit and the config are imported here so the
+    game starts without either.
+    """
+    global _qiskit_registered
+    if _qiskit_registered:
+        return
 
-        elif num_clicks == 2:
-            gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[2])
+    import qiskit
+    from qcatsweeper import qconfig
 
-            if get_one_or_zero(gridScript, q, c, 2) == 1:
-                return TileItems.REVEAL_GROUP
-            return TileItems.NEG_EVAL
+    qiskit.register(qconfig.APItoken, qconfig.config["url"])
+    _qiskit_registered = True
 
-    elif (clicked_tile == TileItems.GROUP5 or clicked_tile == TileItems.GROUP6):  # 3 clicks
-        if num_clicks == 1:
-            gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[3])
- 
-            if get_one_or_zero(gridScript, q, c, 3) == 1:
-                return TileItems.POS_EVAL
-            return TileItems.NEG_EVAL
 
-        elif num_clicks == 2:
-            gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[3])            
+def set_offline(enabled=True):
+    """
+    Offline mode runs on the local engines only: the analytic backend and a
+    local random number generator for the boards.
+    """
+    global offline
+    offline = enabled
+    if not enabled:
+        return
+
+    if _backend is not None and _backend.name in (backends.QiskitBackend.name, 'remote'):
+        set_backend('analytic')
+    if _entropy_pool is not None and \
+            _entropy_pool.provider.name == entropy.ANUProvider.name:
+        set_entropy_source('csprng')
+
+
+def enable_outcome_pool(low_water=8, high_water=32):
+    """
+    Serve clicks from a background-filled buffer of outcomes per click kind.
+    """
+    global _outcome_pool
+    from qcatsweeper.outcome_pool import OutcomePool
 
-            if get_one_or_zero(gridScript, q, c, 3) == 1:
-                return TileItems.POS_EVAL
-            return TileItems.NEG_EVAL
+    disable_outcome_pool()
+    _outcome_pool = OutcomePool(get_backend, CLICK_CIRCUITS, shots,
+                                low_water=low_water, high_water=high_water)
+    _outcome_pool.start()
+    return _outcome_pool
 
-        elif num_clicks == 3:
-            gridScript.u3(0.5 * math.pi, 0.0, 0.0, q[3])
 
-            if get_one_or_zero(gridScript, q, c, 3) == 1:
-                return TileItems.REVEAL_GROUP
-            return TileItems.NEG_EVAL
+def disable_outcome_pool():
+    global _outcome_pool
+    if _outcome_pool is not None:
+        _outcome_pool.stop()
+    _outcome_pool = None
 
+
+def outcome_pool_stats():
+    if _outcome_pool is None:
+        return None
+    return _outcome_pool.stats()
+
+
+def set_sampling(mode, batch_shots=32, confidence=0.99):
+    """
+    params:
+    mode: 'fixed' or 'sequential'
+    batch_shots: shots per batch in sequential mode
+    confidence: how sure sequential mode must be that the remaining shots
+                won't change the majority before it stops
+    """
+    global sampling, sequential_batch_shots, sequential_confidence
+    if mode not in ('fixed', 'sequential'):
+        raise ValueError('Unknown sampling mode: {}'.format(mode))
+    sampling = mode
+    sequential_batch_shots = batch_shots
+    sequential_confidence = confidence
+
+
+def shot_stats():
+    """
+    Average number of shots each decision consumed, against the fixed `shots`.
+    """
+    decisions = _shot_stats['decisions']
+    average = _shot_stats['shots'] / decisions if decisions else 0.0
+    return {
+        'decisions': decisions,
+        'shots': _shot_stats['shots'],
+        'average_shots': average,
+        'saving': 1 - average / shots if decisions else 0.0,
+    }
+
+
+def _record_shots(decisions, used):
+    _shot_stats['decisions'] += decisions
+    _shot_stats['shots'] += used
+
+
+def get_one_or_zero(grid_script, index, kind=None):
+    if _outcome_pool is not None and kind in _outcome_pool.circuits:
+        _record_shots(1, shots)
+        return _outcome_pool.get(kind)
+
+    if sampling == 'sequential':
+        with profiling.timer('backend.execute'):
+            result, used = get_backend().sequential_majority(
+                grid_script, index, shots, sequential_batch_shots, sequential_confidence)
+        _record_shots(1, used)
+        return result
+
+    _record_shots(1, shots)
+    with profiling.timer('backend.execute'):
+        return get_backend().majority(grid_script, index, shots)
+
+
+def set_entropy_source(provider, **pool_options):
+    """
+    params:
+    provider: an entropy.EntropyProvider instance or one of the names in
+              entropy.PROVIDERS ('csprng', 'os', 'anu', 'seeded')
+    pool_options: passed on to entropy.EntropyPool
+    """
+    global _entropy_pool
+    if isinstance(provider, str):
+        if offline and provider == 'anu':
+            raise ValueError('The ANU entropy source is not available offline')
+        provider = entropy.PROVIDERS[provider]()
+    if _entropy_pool is not None:
+        _entropy_pool.stop()
+    _entropy_pool = entropy.EntropyPool(provider, **pool_options)
+    return _entropy_pool
+
+
+def get_entropy_pool():
+    if _entropy_pool is None:
+        set_entropy_source('csprng')
+    return _entropy_pool
+
+
+@profiling.timed('board.generate')
+def new_game_grid(l, bomb_no=20, height=None):
+    """
+    params:
+    l: board width in tiles (and height, unless given)
+    bomb_no: number of bombs
+    returns a board.Board, indexed game_grid[row][col] like a list of lists
+    """
+    from qcatsweeper.board import generate_board
+
+    # bomb positions drawn from the entropy pool (ANU quantum random numbers
+    # when the 'anu' source is configured)
+    return generate_board(get_entropy_pool(), l, height, bomb_no)
+
+
+def click_kind(clicked_tile, num_clicks):
+    if clicked_tile == TileItems.BOMB_UNEXPLODED:
+        return ('bomb', 1)
+    elif clicked_tile == TileItems.GROUP1 or clicked_tile == TileItems.GROUP2:
+        return ('one_click', num_clicks)
+    elif clicked_tile == TileItems.GROUP3 or clicked_tile == TileItems.GROUP4:
+        return ('two_click', num_clicks)
+    elif clicked_tile == TileItems.GROUP5 or clicked_tile == TileItems.GROUP6:
+        return ('three_click', num_clicks)
     return None
+
+
+def click_outcome(kind, result):
+    """
+    Maps the measured majority of a click circuit to its reveal state.
+    """
+    name, num_clicks = kind
+
+    # if there are more 1 hits then the bomb expodes and the game is lost
+    if name == 'bomb':
+        return TileItems.BOMB_EXPLODED if result == 1 else TileItems.BOMB_DEFUSED
+
+    if result == 0:
+        return TileItems.NEG_EVAL
+
+    # the last click a group needs reveals the whole group
+    clicks_needed = {'one_click': 1, 'two_click': 2, 'three_click': 3}[name]
+    if num_clicks == clicks_needed:
+        return TileItems.REVEAL_GROUP
+    return TileItems.POS_EVAL
+
+
+@profiling.timed('click.resolve')
+def onclick(clicked_tile, num_clicks):
+    """
+    params:
+    clicked_tile: tile type of the clicked tile
+    num_click: number of times a group has been clicked
+    """
+    kind = click_kind(clicked_tile, num_clicks)
+    if kind not in CLICK_CIRCUITS:
+        return None
+
+    gridScript, index = CLICK_CIRCUITS[kind]
+    return click_outcome(kind, get_one_or_zero(gridScript, index, kind))
+
+
+@profiling.timed('click.resolve_batch')
+def onclick_batch(clicks):
+    """
+    Resolves several independent clicks with a single backend execution.
+
+    params:
+    clicks: list of (clicked_tile, num_clicks)
+    returns the reveal state of each click, in order
+    """
+    kinds = [click_kind(clicked_tile, num_clicks) for clicked_tile, num_clicks in clicks]
+    todo = [i for i, kind in enumerate(kinds) if kind in CLICK_CIRCUITS]
+
+    _record_shots(len(todo), len(todo) * shots)
+    if _outcome_pool is not None:
+        results = [_outcome_pool.get(kinds[i]) for i in todo]
+    else:
+        with profiling.timer('backend.execute_batch'):
+            results = get_backend().majority_batch(
+                [CLICK_CIRCUITS[kinds[i]] for i in todo], shots)
+
+    reveal_states = [None] * len(clicks)
+    for i, result in zip(todo, results):
+        reveal_states[i] = click_outcome(kinds[i], result)
+    return reveal_states
@@ -0,0 +1,318 @@
+"""
+Hosts many headless games at once over a local socket. Clicks from every
+session go to one OutcomeService, which resolves them together in one
+batched backend execution per tick.
+
+    python -m qcatsweeper.server --port 8765
+
+The protocol is one JSON object per line in each direction, every request
+carries an `id` that is echoed in its reply:
+
+    {"id": 1, "op": "new", "size": 12, "bombs": 20}
+    {"id": 1, "ok": true, "session": 1, "size": 12}
+    {"id": 2, "op": "click", "session": 1, "row": 3, "col": 4}
+    {"id": 2, "ok": true, "outcome": "POS_EVAL", "status": "PLAYING",
+     "tiles": [[3, 4, "1"]]}
+    {"id": 3, "op": "close", "session": 1}
+
+A connection can hold several sessions.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+from qcatsweeper import profiling
+from qcatsweeper.engine import GameEngine
+
+import qcatsweeper.quantum_logic as ql
+
+
+class ServerBusy(Exception):
+    """
+    The server is out of room for another session or click.
+    """
+
+
+class OutcomeService:
+    """
+    Collects the clicks of every session and resolves everything that
+    arrived during a tick with one ql.onclick_batch call on a worker thread.
+    At most `max_pending` clicks wait at a time, further clicks wait for
+    room, which slows their connections down.
+    """
+
+    def __init__(self, tick=0.005, max_batch=512, max_pending=4096,
+                 resolve_batch=ql.onclick_batch):
+        """
+        params:
+        tick: seconds between two batches
+        max_batch: most clicks resolved by one backend execution
+        max_pending: most clicks waiting to be resolved
+        resolve_batch: function [(clicked_tile, num_clicks)] -> [reveal state]
+        """
+        self.tick = tick
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._resolve_batch = resolve_batch
+
+        self._queue = []
+        self._room = None
+        self._wanted = None
+        self._task = None
+
+        self.batches = 0
+        self.resolved = 0
+
+    def start(self):
+        self._room = asyncio.Semaphore(self.max_pending)
+        self._wanted = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    async def resolve(self, clicked_tile, num_clicks):
+        await self._room.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((clicked_tile, num_clicks, future))
+        self._wanted.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wanted.wait()
+            # Give the other sessions' clicks of this tick a chance to join
+            await asyncio.sleep(self.tick)
+
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if not self._queue:
+                self._wanted.clear()
+
+            clicks = [(tile, n) for tile, n, _ in batch]
+            try:
+                with profiling.timer('server.batch'):
+                    reveal_states = await loop.run_in_executor(
+                        None, self._resolve_batch, clicks)
+            except Exception as e:
+                print('Click batch failed: {}'.format(e))
+                # Like the GUI, a failed click doesn't count
+                reveal_states = [None] * len(batch)
+
+            for (_, _, future), reveal_state in zip(batch, reveal_states):
+                if not future.done():
+                    future.set_result(reveal_state)
+                self._room.release()
+
+            self.batches += 1
+            self.resolved += len(batch)
+
+
+class Session:
+    """
+    One game, clicks are applied one at a time.
+    """
+
+    def __init__(self, session_id, size, bomb_no):
+        self.session_id = session_id
+        self.engine = GameEngine(size, bomb_no)
+        self.lock = asyncio.Lock()
+
+    @property
+    def nbytes(self):
+        return session_bytes(self.engine.grid_size)
+
+    async def click(self, row, col, outcomes):
+        async with self.lock:
+            engine = self.engine
+            pending = engine.begin_click(row, col)
+            if pending is None and not engine.dirty_tiles:
+                return None, []
+
+            reveal_state = None
+            if pending is not None:
+                clicked_tile, num_clicks = pending
+                reveal_state = await outcomes.resolve(clicked_tile, num_clicks)
+                engine.apply_click_result(row, col, clicked_tile, reveal_state)
+
+            tiles = [[r, c, engine.tile_label(r, c) if engine.is_revealed(r, c) else None]
+                     for r, c in sorted(engine.take_dirty_tiles())]
+            return reveal_state, tiles
+
+
+def session_bytes(size):
+    """
+    Rough memory use of a session on a size x size board: the board, its
+    tile index, the bit arrays and marks, and the engine around them.
+    """
+    cells = size * size
+    return cells * 1 + cells * 40 + (cells * 10 + 7) // 8 + 4096
+
+
+class GameServer:
+    """
+    Serves the protocol described above.
+    """
+
+    def __init__(self, outcomes=None, max_sessions=100000, max_session_bytes=1 << 20,
+                 max_connection_bytes=64 << 20, max_in_flight=64):
+        """
+        params:
+        outcomes: the shared OutcomeService
+        max_sessions: most sessions on the whole server
+        max_session_bytes: largest session allowed, see session_bytes
+        max_connection_bytes: most session memory one connection can hold
+        max_in_flight: most unanswered requests of a connection, it isn't
+                       read from any further until some are answered
+        """
+        self.outcomes = outcomes or OutcomeService()
+        self.max_sessions = max_sessions
+        self.max_session_bytes = max_session_bytes
+        self.max_connection_bytes = max_connection_bytes
+        self.max_in_flight = max_in_flight
+
+        self.sessions = 0
+        self.clicks = 0
+        self._session_ids = itertools.count(1)
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self.outcomes.start()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        sessions = {}
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                # Backpressure, a connection with too much in flight is not read
+                await in_flight.acquire()
+                line = await reader.readline()
+                if not line:
+                    in_flight.release()
+                    break
+                task = asyncio.ensure_future(
+                    self._handle_line(line, sessions, writer, write_lock, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError):
+            # ValueError is a line over the reader's limit
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.sessions -= len(sessions)
+            sessions.clear()
+            writer.close()
+
+    async def _handle_line(self, line, sessions, writer, write_lock, in_flight):
+        request = {}
+        try:
+            request = json.loads(line)
+            reply = await self.handle_request(request, sessions)
+        except ServerBusy as e:
+            reply = {'ok': False, 'error': str(e), 'busy': True}
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        finally:
+            in_flight.release()
+        reply['id'] = request.get('id') if isinstance(request, dict) else None
+
+        try:
+            async with write_lock:
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def handle_request(self, request, sessions):
+        op = request.get('op')
+        if op == 'new':
+            size = int(request.get('size', 12))
+            bomb_no = int(request.get('bombs', 20))
+            if session_bytes(size) > self.max_session_bytes:
+                raise ValueError('A {0}x{0} board is over the session memory limit'.format(size))
+            if self.sessions >= self.max_sessions:
+                raise ServerBusy('Too many sessions')
+            used = sum(session.nbytes for session in sessions.values())
+            if used + session_bytes(size) > self.max_connection_bytes:
+                raise ServerBusy('Connection is over its memory limit')
+
+            session = Session(next(self._session_ids), size, bomb_no)
+            sessions[session.session_id] = session
+            self.sessions += 1
+            return {'ok': True, 'session': session.session_id, 'size': size}
+
+        session = sessions.get(request.get('session'))
+        if session is None:
+            raise ValueError('Unknown session')
+
+        if op == 'click':
+            with profiling.timer('server.click'):
+                reveal_state, tiles = await session.click(
+                    int(request['row']), int(request['col']), self.outcomes)
+            self.clicks += 1
+            return {
+                'ok': True,
+                'outcome': None if reveal_state is None else reveal_state.name,
+                'status': session.engine.status.name,
+                'tiles': tiles,
+            }
+
+        if op == 'close':
+            del sessions[session.session_id]
+            self.sessions -= 1
+            return {'ok': True}
+
+        raise ValueError('Unknown op: {}'.format(op))
+
+    def stats(self):
+        return {
+            'sessions': self.sessions,
+            'clicks': self.clicks,
+            'batches': self.outcomes.batches,
+            'pending': self.outcomes.pending,
+        }
+
+
+async def serve(host, port, tick, max_batch):
+    server = GameServer(OutcomeService(tick=tick, max_batch=max_batch))
+    listener = await server.start(host, port)
+    print('Serving on {}:{}'.format(host, port))
+    try:
+        await listener.serve_forever()
+    finally:
+        listener.close()
+        await listener.wait_closed()
+        await server.outcomes.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantum catsweeper game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--backend', default='analytic',
+                        help='outcome backend, one of analytic, qiskit, emulator')
+    parser.add_argument('--tick', type=float, default=0.005,
+                        help='seconds between two batched backend executions')
+    parser.add_argument('--max-batch', type=int, default=512)
+    args = parser.parse_args()
+
+    ql.set_backend(args.backend)
+    try:
+        asyncio.run(serve(args.host, args.port, args.tick, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+A game's board and tile state in shared memory, so other processes (bots,
+spectators, stats collectors) can follow it without any copying or
+serialization.
+
+    python -m qcatsweeper.shared_state NAME  # prints every change of game NAME
+
+Layout of the segment, all little-endian:
+
+    header   8 int64: magic, layout version, rows, cols, sequence number,
+             GameStatus value, clicks, golden cat position (row * cols + col)
+    codes    rows * cols int8, the TileItems value of every tile
+    clicked  packed bits, see state.TileState
+    revealed packed bits
+    marks    rows * cols int8
+
+Protocol: there is one writer, the GameEngine the segment was given to, and
+any number of readers. The sequence number is a seqlock: the writer makes
+it odd before it changes anything and even again once the change is
+complete, so `sequence // 2` is a version that goes up by one per engine
+write. GameEngine.reset, begin_click and apply_click_result are each one
+write, so a click that waits on a quantum decision moves the version on
+twice: once when the tile turns face up and once when its outcome lands.
+A reader notes the sequence number, reads what it needs straight from the
+arrays, and keeps what it read only if the number was even and is still
+the same afterwards, otherwise it reads again. Readers never write.
+"""
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import argparse
+import time
+
+import numpy as np
+
+
+MAGIC = int.from_bytes(b'QCSM', 'little')
+LAYOUT_VERSION = 1
+
+HEADER_FIELDS = 8
+(_MAGIC, _LAYOUT, _ROWS, _COLS, _SEQUENCE, _STATUS, _CLICKS, _GOLDEN_CAT) = \
+    range(HEADER_FIELDS)
+
+# The golden cat slot when there is no cat on the board
+NO_GOLDEN_CAT = -1
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def segment_size(rows, cols):
+    cells = rows * cols
+    bits = (cells + 7) // 8
+    return _align(_align(_align(HEADER_FIELDS * 8 + cells) + bits) + bits) + cells
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the resource tracker of every process that
+        # attaches would unlink the segment when that process exits
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedGame:
+    """
+    Numpy views of a shared memory segment laid out as above. Create one
+    with `create` in the writing process and pass it to the GameEngine,
+    other processes `attach` to it by name.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+
+        self.header = np.ndarray((HEADER_FIELDS,), dtype='<i8', buffer=buf)
+        if self.header[_MAGIC] != MAGIC:
+            raise ValueError('{} is not a shared catsweeper game'.format(shm.name))
+        if self.header[_LAYOUT] != LAYOUT_VERSION:
+            raise ValueError('Unsupported shared game layout: {}'.format(self.header[_LAYOUT]))
+
+        self.rows = rows = int(self.header[_ROWS])
+        self.cols = cols = int(self.header[_COLS])
+        cells = rows * cols
+        bits = (cells + 7) // 8
+
+        offset = HEADER_FIELDS * 8
+        self.codes = np.ndarray((rows, cols), dtype=np.int8, buffer=buf, offset=offset)
+        offset = _align(offset + cells)
+        self.clicked = np.ndarray((bits,), dtype=np.uint8, buffer=buf, offset=offset)
+        offset = _align(offset + bits)
+        self.revealed = np.ndarray((bits,), dtype=np.uint8, buffer=buf, offset=offset)
+        offset = _align(offset + bits)
+        self.marks = np.ndarray((cells,), dtype=np.int8, buffer=buf, offset=offset)
+
+        # A write made inside another only counts once
+        self._write_depth = 0
+
+    @classmethod
+    def create(cls, rows, cols, name=None):
+        """
+        Makes a new segment for a rows x cols board, this process is its
+        writer and unlinks it on `close`.
+        """
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=segment_size(rows, cols))
+        header = np.ndarray((HEADER_FIELDS,), dtype='<i8', buffer=shm.buf)
+        header[:] = 0
+        header[_ROWS], header[_COLS] = rows, cols
+        header[_GOLDEN_CAT] = NO_GOLDEN_CAT
+        header[_LAYOUT] = LAYOUT_VERSION
+        # Last, a reader that sees the magic sees a complete header
+        header[_MAGIC] = MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Opens an existing segment to read it.
+        """
+        return cls(_attach(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def sequence(self):
+        return int(self.header[_SEQUENCE])
+
+    @property
+    def version(self):
+        """
+        Number of completed engine writes, it only changes when the game does
+        """
+        return self.sequence // 2
+
+    #### Writer side ####
+
+    @contextmanager
+    def writing(self):
+        """
+        Wraps one change of the game, readers retry anything they read
+        while it runs.
+        """
+        if self._write_depth == 0:
+            self.header[_SEQUENCE] += 1
+        self._write_depth += 1
+        try:
+            yield self
+        finally:
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                self.header[_SEQUENCE] += 1
+
+    def publish(self, status, clicks, golden_cat):
+        """
+        Sets the header fields, inside `writing`.
+
+        params:
+        status: GameStatus value
+        golden_cat: (row, col) or None
+        """
+        self.header[_STATUS] = status
+        self.header[_CLICKS] = clicks
+        self.header[_GOLDEN_CAT] = NO_GOLDEN_CAT if golden_cat is None else \
+            golden_cat[0] * self.cols + golden_cat[1]
+
+    #### Reader side ####
+
+    def read(self, fn, retries=1000):
+        """
+        Runs fn(self) until it ran without the writer changing anything, fn
+        should only read from the arrays and return copies of what it keeps.
+        returns (version, what fn returned)
+        """
+        for _ in range(retries):
+            before = self.sequence
+            if before & 1:
+                # A write is in progress
+                time.sleep(0)
+                continue
+            result = fn(self)
+            if self.sequence == before:
+                return before // 2, result
+        raise TimeoutError('The writer never left the game alone for long enough')
+
+    def snapshot(self):
+        """
+        returns (version, dict) with copies of the header and every array
+        """
+        def copy(game):
+            return {
+                'status': int(game.header[_STATUS]),
+                'clicks': int(game.header[_CLICKS]),
+                'golden_cat': int(game.header[_GOLDEN_CAT]),
+                'codes': game.codes.copy(),
+                'clicked': game.clicked.copy(),
+                'revealed': game.revealed.copy(),
+                'marks': game.marks.copy(),
+            }
+        return self.read(copy)
+
+    def wait_for_change(self, version, timeout=None, poll=0.005):
+        """
+        Waits for the version to move on from `version`.
+        returns the new version, or the old one after `timeout` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.version == version:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(poll)
+        return self.version
+
+    def close(self):
+        """
+        Drops the views, and the segment itself if this process created it.
+        """
+        self.header = self.codes = self.clicked = self.revealed = self.marks = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # An engine still holds views of it, the mapping goes with them
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow a shared catsweeper game')
+    parser.add_argument('name', help='shared memory name, see main.py share=NAME')
+    args = parser.parse_args()
+
+    from qcatsweeper.engine import GameStatus
+
+    game = SharedGame.attach(args.name)
+    version = None
+    try:
+        while True:
+            version = game.wait_for_change(version)
+            version, stats = game.read(lambda g: (
+                int(g.header[_STATUS]), int(g.header[_CLICKS]),
+                int(np.unpackbits(g.revealed).sum())))
+            status, clicks, revealed = stats
+            print('version {}: {} after {} clicks, {} tiles face up'.format(
+                version, GameStatus(status).name, clicks, revealed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        game.close()
+
+
+if __name__ == '__main__':
+    main()
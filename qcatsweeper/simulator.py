@@ -0,0 +1,185 @@
+"""
+Plays lots of headless games with scripted click policies across a process
+pool and reports how they went.
+
+    python -m qcatsweeper.simulator --games 1000000 --policy random
+"""
+from multiprocessing import Pool
+
+import argparse
+import json
+import os
+import random
+import time
+
+from qcatsweeper import backends
+from qcatsweeper.engine import GameEngine, GameStatus
+from qcatsweeper.entropy import SeededProvider
+
+import qcatsweeper.quantum_logic as ql
+
+
+def random_policy(engine, rng):
+    """
+    Clicks any tile that can still be clicked.
+    """
+    # Guessing is much cheaper than listing every clickable tile while most
+    # of the board is still clickable
+    for _ in range(32):
+        r, c = rng.randrange(engine.grid_size), rng.randrange(engine.grid_size)
+        if engine.is_clickable(r, c):
+            return r, c
+
+    tiles = [(r, c) for r in range(engine.grid_size) for c in range(engine.grid_size)
+             if engine.is_clickable(r, c)]
+    return rng.choice(tiles) if tiles else None
+
+
+def scan_policy(engine, rng):
+    """
+    Clicks tiles row by row, left to right.
+    """
+    for r in range(engine.grid_size):
+        for c in range(engine.grid_size):
+            if engine.is_clickable(r, c):
+                return r, c
+    return None
+
+
+def group_policy(engine, rng):
+    """
+    Keeps clicking the group that is closest to being revealed, random tiles
+    when no group has been started.
+    """
+    started = sorted(engine.clicked_group_times.items(), key=lambda x: -x[1])
+    for tile, _ in started:
+        tiles = [(r, c) for r, c in engine.game_grid.group_positions(tile)
+                 if engine.is_clickable(r, c)]
+        if tiles:
+            return rng.choice(tiles)
+    return random_policy(engine, rng)
+
+
+def hint_policy(engine, rng):
+    """
+    Clicks the tile the hint engine rates most likely to be the golden cat.
+    Needs an engine made with hints=True.
+    """
+    return engine.hints.best_click(engine.tiles.revealed_mask())
+
+
+POLICIES = {
+    'random': random_policy,
+    'scan': scan_policy,
+    'group': group_policy,
+    'hint': hint_policy,
+}
+
+
+def play_game(engine, policy, rng, max_clicks=10000):
+    """
+    Plays one game on an already reset engine.
+    returns (status, number of clicks)
+    """
+    while engine.status is GameStatus.PLAYING and engine.clicks < max_clicks:
+        pos = policy(engine, rng)
+        if pos is None:
+            break
+        engine.click(*pos)
+    return engine.status, engine.clicks
+
+
+def _play_chunk(args):
+    policy_name, games, grid_size, bomb_no, seed, quantum_groups = args
+
+    # Every chunk is reproducible from its seed
+    ql.set_entropy_source(SeededProvider(seed), background=False)
+    ql.set_backend(backends.AnalyticBackend(random.Random(seed)))
+
+    rng = random.Random(seed)
+    policy = POLICIES[policy_name]
+    engine = GameEngine(grid_size, bomb_no, hints=policy is hint_policy,
+                        quantum_groups=quantum_groups, rng=random.Random(seed + 1))
+
+    totals = {'games': 0, 'won': 0, 'lost': 0, 'unfinished': 0,
+              'clicks': 0, 'clicks_to_win': 0}
+    for i in range(games):
+        if i > 0:
+            engine.reset()
+        status, clicks = play_game(engine, policy, rng)
+
+        totals['games'] += 1
+        totals['clicks'] += clicks
+        if status is GameStatus.WON:
+            totals['won'] += 1
+            totals['clicks_to_win'] += clicks
+        elif status is GameStatus.LOST:
+            totals['lost'] += 1
+        else:
+            totals['unfinished'] += 1
+    return totals
+
+
+def simulate(games, policy='random', grid_size=12, bomb_no=20, workers=None,
+             chunk_size=1000, seed=0, quantum_groups=False):
+    """
+    params:
+    games: number of games to play
+    policy: name of the click policy in POLICIES
+    workers: number of processes, defaults to the number of CPUs
+    chunk_size: games per task handed to a worker
+    seed: base seed, the same seed reproduces the same report
+    quantum_groups: play with persistent group states, see GameEngine
+    """
+    chunks = []
+    for i, start in enumerate(range(0, games, chunk_size)):
+        chunks.append((policy, min(chunk_size, games - start), grid_size,
+                       bomb_no, seed * 1000003 + i, quantum_groups))
+
+    started = time.time()
+    if workers == 1:
+        results = list(map(_play_chunk, chunks))
+    else:
+        with Pool(workers or os.cpu_count()) as pool:
+            results = pool.map(_play_chunk, chunks)
+    elapsed = time.time() - started
+
+    totals = {}
+    for result in results:
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+
+    played = totals.get('games', 0)
+    return {
+        'policy': policy,
+        'games': played,
+        'win_rate': totals['won'] / played if played else 0.0,
+        'explosion_rate': totals['lost'] / played if played else 0.0,
+        'unfinished': totals.get('unfinished', 0),
+        'mean_clicks': totals['clicks'] / played if played else 0.0,
+        'mean_clicks_to_win': totals['clicks_to_win'] / totals['won'] if totals.get('won') else 0.0,
+        'seconds': elapsed,
+        'games_per_second': played / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless quantum catsweeper batch simulator')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--grid-size', type=int, default=12)
+    parser.add_argument('--bombs', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quantum-groups', action='store_true',
+                        help='groups keep their quantum state between clicks')
+    args = parser.parse_args()
+
+    report = simulate(args.games, args.policy, args.grid_size, args.bombs,
+                      args.workers, args.chunk_size, args.seed, args.quantum_groups)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
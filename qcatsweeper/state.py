@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class TileState:
+    """
+    Per-tile state of one game: clicked and revealed as packed bit arrays
+    and a small int evaluation mark per tile (see the MARK_ constants in
+    qcatsweeper.engine), about 1.25 bytes per tile.
+    Positions are flat (row * cols + col) internally.
+    """
+
+    def __init__(self, rows, cols, clicked=None, revealed=None, marks=None):
+        """
+        params:
+        clicked, revealed, marks: existing arrays to keep the state in, e.g.
+                                  views of shared memory, they are cleared
+        """
+        self.rows = rows
+        self.cols = cols
+        size = rows * cols
+        self.clicked = np.zeros((size + 7) // 8, dtype=np.uint8) if clicked is None else clicked
+        self.revealed = np.zeros((size + 7) // 8, dtype=np.uint8) if revealed is None else revealed
+        self.marks = np.zeros(size, dtype=np.int8) if marks is None else marks
+        if clicked is not None or revealed is not None or marks is not None:
+            self.clear()
+
+    @property
+    def nbytes(self):
+        return self.clicked.nbytes + self.revealed.nbytes + self.marks.nbytes
+
+    def clear(self):
+        self.clicked[:] = 0
+        self.revealed[:] = 0
+        self.marks[:] = 0
+
+    def _pos(self, row, col):
+        return row * self.cols + col
+
+    @staticmethod
+    def _test(bits, pos):
+        return bool(bits[pos >> 3] & (1 << (pos & 7)))
+
+    @staticmethod
+    def _set(bits, pos):
+        bits[pos >> 3] |= 1 << (pos & 7)
+
+    def is_clicked(self, row, col):
+        return self._test(self.clicked, self._pos(row, col))
+
+    def set_clicked(self, row, col):
+        self._set(self.clicked, self._pos(row, col))
+
+    def is_revealed(self, row, col):
+        return self._test(self.revealed, self._pos(row, col))
+
+    def set_revealed(self, row, col):
+        self._set(self.revealed, self._pos(row, col))
+
+    def reveal_many(self, flat_positions):
+        flat_positions = np.asarray(flat_positions, dtype=np.int64)
+        np.bitwise_or.at(self.revealed, flat_positions >> 3,
+                         (1 << (flat_positions & 7)).astype(np.uint8))
+
+    def revealed_at(self, flat_positions):
+        """
+        returns a bool array, whether each of the flat positions is revealed
+        """
+        flat_positions = np.asarray(flat_positions, dtype=np.int64)
+        return ((self.revealed[flat_positions >> 3] >> (flat_positions & 7)) & 1).astype(bool)
+
+    def get_mark(self, row, col):
+        return int(self.marks[self._pos(row, col)])
+
+    def set_mark(self, row, col, mark):
+        self.marks[self._pos(row, col)] = mark
+
+    #### Whole board queries ####
+
+    def _mask(self, bits):
+        return np.unpackbits(bits, count=self.rows * self.cols,
+                             bitorder='little').view(bool).reshape(self.rows, self.cols)
+
+    def clicked_mask(self):
+        return self._mask(self.clicked)
+
+    def revealed_mask(self):
+        return self._mask(self.revealed)
+
+    def clicked_count(self):
+        return int(np.unpackbits(self.clicked).sum())
+
+    def revealed_in_group(self, codes, group):
+        """
+        returns the (rows, cols) arrays of revealed tiles of a group
+        """
+        return np.nonzero(self.revealed_mask() & (codes == group.value))
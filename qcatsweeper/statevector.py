@@ -0,0 +1,222 @@
+"""
+Small in-process state vector engine, and the persistent quantum state of
+every tile group built on it.
+
+In the default game every click runs a fresh circuit from |0> and takes the
+majority of its shots. With GroupStates each group keeps its own register
+between clicks instead: a click applies the group's gate to it once and
+then measures it weakly, so earlier clicks change the odds of later ones.
+"""
+import math
+import random
+
+import numpy as np
+
+from qcatsweeper.backends import gate_matrix
+
+import qcatsweeper.quantum_logic as ql
+
+
+X = np.array([[0, 1], [1, 0]], dtype=np.complex128)
+
+
+def ry_matrix(theta):
+    c, s = math.cos(theta / 2), math.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=np.complex128)
+
+
+class StateVector:
+    """
+    The 2^n amplitudes of n qubits, qubit 0 is the lowest bit of the basis
+    state index like in qiskit. A gate on a qubit mixes the pairs of
+    amplitudes whose indices only differ in that qubit's bit, the index
+    pairs are worked out once per register size and kept.
+    """
+
+    # (num_qubits, qubit, control) -> (indices with the bit 0, with the bit 1)
+    _pairs = {}
+
+    def __init__(self, num_qubits, amplitudes=None):
+        self.num_qubits = num_qubits
+        if amplitudes is None:
+            amplitudes = np.zeros(1 << num_qubits, dtype=np.complex128)
+            amplitudes[0] = 1
+        self.amplitudes = np.array(amplitudes, dtype=np.complex128)
+
+    def _pair(self, qubit, control=None):
+        key = (self.num_qubits, qubit, control)
+        pair = self._pairs.get(key)
+        if pair is None:
+            indices = np.arange(1 << self.num_qubits)
+            zeros = indices[(indices >> qubit) & 1 == 0]
+            if control is not None:
+                zeros = zeros[(zeros >> control) & 1 == 1]
+            pair = self._pairs[key] = (zeros, zeros | (1 << qubit))
+        return pair
+
+    def _apply_to(self, pair, matrix):
+        zeros, ones = pair
+        a0, a1 = self.amplitudes[zeros], self.amplitudes[ones]
+        self.amplitudes[zeros] = matrix[0, 0] * a0 + matrix[0, 1] * a1
+        self.amplitudes[ones] = matrix[1, 0] * a0 + matrix[1, 1] * a1
+
+    def apply(self, matrix, qubit):
+        """
+        params:
+        matrix: 2x2 unitary as a numpy array
+        """
+        self._apply_to(self._pair(qubit), matrix)
+
+    def apply_controlled(self, matrix, control, target):
+        """
+        Applies the 2x2 unitary to `target` where `control` is 1.
+        """
+        self._apply_to(self._pair(target, control), matrix)
+
+    def prob_one(self, qubit):
+        ones = self.amplitudes[self._pair(qubit)[1]]
+        return float(np.vdot(ones, ones).real)
+
+    def project(self, qubit, result):
+        """
+        Collapses the state to `result` on `qubit` and renormalizes.
+        returns the probability that result had
+        """
+        self.amplitudes[self._pair(qubit)[1 - result]] = 0
+        probability = float(np.vdot(self.amplitudes, self.amplitudes).real)
+        if probability > 0:
+            self.amplitudes /= math.sqrt(probability)
+        return probability
+
+    def measure(self, qubit, rng=random):
+        """
+        Measures one qubit, leaving the others in their post-measurement state.
+        returns 0 or 1
+        """
+        result = 1 if rng.random() < self.prob_one(qubit) else 0
+        self.project(qubit, result)
+        return result
+
+    def copy(self):
+        return StateVector(self.num_qubits, self.amplitudes)
+
+
+# Qubits of a group's register
+PROGRESS = 0
+PROBE = 1
+
+# How strongly a click's probe is coupled to the progress qubit, pi would be
+# a full measurement that wipes what earlier clicks did
+DEFAULT_STRENGTH = 2 * math.pi / 3
+
+
+def _group_gate(kind):
+    # The same gate the one shot circuits of CLICK_CIRCUITS apply
+    circuit, _ = ql.CLICK_CIRCUITS[kind]
+    return np.array(gate_matrix(circuit.gates[0]), dtype=np.complex128)
+
+
+class GroupStates:
+    """
+    A two qubit register per tile group: a progress qubit that every click
+    of the group rotates by the group's gate, and a probe qubit that is
+    coupled to it with a controlled rotation and measured. A 1 on the probe
+    is a successful click. The progress qubit is never measured directly,
+    so it carries over from click to click, and a click costs the same
+    handful of 4 amplitude updates however many came before it.
+
+    Every click is a single measurement of the register, not a majority of
+    shots. Bombs aren't groups and still go through ql.onclick.
+    """
+
+    def __init__(self, strength=DEFAULT_STRENGTH, rng=None):
+        """
+        params:
+        strength: rotation angle of the probe coupling, between 0 and pi
+        rng: random.Random for the measurements
+        """
+        self.strength = strength
+        self.rng = rng or random.Random()
+        self._coupling = ry_matrix(strength)
+        self._gates = {}
+
+        # TileItems group -> StateVector
+        self.states = {}
+
+    @staticmethod
+    def handles(clicked_tile, num_clicks):
+        kind = ql.click_kind(clicked_tile, num_clicks)
+        return kind is not None and kind[0] != 'bomb' and kind in ql.CLICK_CIRCUITS
+
+    def state(self, group):
+        state = self.states.get(group)
+        if state is None:
+            state = self.states[group] = StateVector(2)
+        return state
+
+    def _evolve(self, state, kind):
+        gate = self._gates.get(kind)
+        if gate is None:
+            gate = self._gates[kind] = _group_gate(kind)
+        state.apply(gate, PROGRESS)
+        state.apply_controlled(self._coupling, PROGRESS, PROBE)
+
+    def prob_one(self, clicked_tile, num_clicks):
+        """
+        returns the probability that the next click of the group succeeds,
+        without touching its state
+        """
+        state = self.state(clicked_tile).copy()
+        self._evolve(state, ql.click_kind(clicked_tile, num_clicks))
+        return state.prob_one(PROBE)
+
+    def click(self, clicked_tile, num_clicks):
+        """
+        Evolves and measures the group's register.
+        returns the reveal state, like ql.onclick
+        """
+        kind = ql.click_kind(clicked_tile, num_clicks)
+        state = self.state(clicked_tile)
+        self._evolve(state, kind)
+        result = state.measure(PROBE, self.rng)
+        # The probe is reused by the next click
+        if result:
+            state.apply(X, PROBE)
+        return ql.click_outcome(kind, result)
+
+    def snapshot(self):
+        """
+        returns a copy of every register and of the random state, to go
+        back to with restore
+        """
+        return ({group: state.amplitudes.copy() for group, state in self.states.items()},
+                self.rng.getstate())
+
+    def restore(self, snapshot):
+        amplitudes, rng_state = snapshot
+        self.states = {group: StateVector(2, a) for group, a in amplitudes.items()}
+        self.rng.setstate(rng_state)
+
+    def clear(self):
+        self.states = {}
+
+
+def rebuild_state(kinds, results, strength=DEFAULT_STRENGTH):
+    """
+    Builds a group's register from scratch by replaying every click it has
+    had, what the persistent state saves. Each click's measurement is
+    replaced by projecting on its recorded result.
+
+    params:
+    kinds: click_kind of each past click
+    results: the probe measured on each of them, 0 or 1
+    """
+    coupling = ry_matrix(strength)
+    state = StateVector(2)
+    for kind, result in zip(kinds, results):
+        state.apply(_group_gate(kind), PROGRESS)
+        state.apply_controlled(coupling, PROGRESS, PROBE)
+        state.project(PROBE, result)
+        if result:
+            state.apply(X, PROBE)
+    return state
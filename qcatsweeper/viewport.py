@@ -0,0 +1,99 @@
+class Viewport:
+    """
+    The part of the board that is on screen. Boards bigger than the screen
+    are scrolled and zoomed, and only the visible tiles are ever drawn or
+    hit-tested, so the cost of a frame doesn't depend on the board size.
+    """
+
+    def __init__(self, rows, cols, x, y, width, height, tile_sizes=(12, 8, 6, 4, 3, 2)):
+        """
+        params:
+        rows, cols: board size in tiles
+        x, y: screen position of the top left of the board area
+        width, height: size of the board area in pixels
+        tile_sizes: zoom levels, pixels per tile, most zoomed in first
+        """
+        self.rows = rows
+        self.cols = cols
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.tile_sizes = tile_sizes
+
+        self.zoom_level = 0
+        self.top_row = 0
+        self.left_col = 0
+
+    @property
+    def tile_size(self):
+        return self.tile_sizes[self.zoom_level]
+
+    @property
+    def visible_rows(self):
+        return min(self.rows, self.height // self.tile_size)
+
+    @property
+    def visible_cols(self):
+        return min(self.cols, self.width // self.tile_size)
+
+    def resize_board(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.scroll(0, 0)
+
+    def visible_range(self):
+        """
+        returns (first row, last row + 1, first col, last col + 1)
+        """
+        return (self.top_row, self.top_row + self.visible_rows,
+                self.left_col, self.left_col + self.visible_cols)
+
+    def is_visible(self, row, col):
+        return self.top_row <= row < self.top_row + self.visible_rows and \
+            self.left_col <= col < self.left_col + self.visible_cols
+
+    def scroll(self, rows, cols):
+        """
+        Moves the view by a number of tiles, returns whether it moved.
+        """
+        top_row = max(0, min(self.rows - self.visible_rows, self.top_row + rows))
+        left_col = max(0, min(self.cols - self.visible_cols, self.left_col + cols))
+        moved = (top_row, left_col) != (self.top_row, self.left_col)
+        self.top_row, self.left_col = top_row, left_col
+        return moved
+
+    def zoom(self, levels):
+        """
+        Zooms in (negative) or out (positive) keeping the centre tile where
+        it was, returns whether the zoom changed.
+        """
+        zoom_level = max(0, min(len(self.tile_sizes) - 1, self.zoom_level + levels))
+        if zoom_level == self.zoom_level:
+            return False
+
+        centre_row = self.top_row + self.visible_rows // 2
+        centre_col = self.left_col + self.visible_cols // 2
+        self.zoom_level = zoom_level
+        self.top_row = centre_row - self.visible_rows // 2
+        self.left_col = centre_col - self.visible_cols // 2
+        self.scroll(0, 0)
+        return True
+
+    def tile_to_screen(self, row, col):
+        return (self.x + self.tile_size * (col - self.left_col),
+                self.y + self.tile_size * (row - self.top_row))
+
+    def screen_to_tile(self, x, y):
+        """
+        returns the (row, col) under a screen position, or None when it is
+        outside the visible board
+        """
+        if x < self.x or y < self.y:
+            return None
+
+        row = self.top_row + (y - self.y) // self.tile_size
+        col = self.left_col + (x - self.x) // self.tile_size
+        if not self.is_visible(row, col):
+            return None
+        return int(row), int(col)
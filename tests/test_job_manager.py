@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+import unittest
+
+from qcatsweeper import backends
+from qcatsweeper.job_manager import FakeRemoteService, RemoteBackend
+
+import qcatsweeper.quantum_logic as ql
+
+
+CIRCUIT, INDEX = ql.CLICK_CIRCUITS[('two_click', 1)]
+SHOTS = 64
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class RemoteBackendTest(unittest.TestCase):
+
+    def make_backend(self, service, **kwargs):
+        backend = RemoteBackend(service, fallback=backends.AnalyticBackend(random.Random(0)),
+                                **kwargs)
+        self.addCleanup(backend.stop)
+        return backend
+
+    def majority_in_threads(self, backend, count):
+        results = [None] * count
+
+        def run(i):
+            results[i] = backend.majority(CIRCUIT, INDEX, SHOTS)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_result_from_service(self):
+        service = FakeRemoteService(latency=0.01, seed=0)
+        backend = self.make_backend(service, latency_budget=5.0)
+
+        self.assertIn(backend.majority(CIRCUIT, INDEX, SHOTS), (0, 1))
+        self.assertEqual(service.submitted, 1)
+        self.assertEqual(backend.fallbacks, 0)
+
+    def test_requests_within_window_share_a_job(self):
+        service = FakeRemoteService(latency=0.05, seed=0)
+        backend = self.make_backend(service, latency_budget=5.0, coalesce_window=0.3)
+
+        threads, results = self.majority_in_threads(backend, 4)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(service.submitted, 1)
+        self.assertEqual(backend.jobs_submitted, 1)
+        self.assertEqual(backend.requests_coalesced, 3)
+        self.assertEqual(backend.fallbacks, 0)
+        self.assertTrue(all(result in (0, 1) for result in results))
+
+    def test_latency_budget_falls_back_and_cancels(self):
+        service = FakeRemoteService(latency=10.0, seed=0)
+        backend = self.make_backend(service, latency_budget=0.1, coalesce_window=0.0)
+
+        started = time.monotonic()
+        self.assertIn(backend.majority(CIRCUIT, INDEX, SHOTS), (0, 1))
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(backend.fallbacks, 1)
+
+        # Nobody waits for the job any more, so it is cancelled on the service
+        self.assertTrue(wait_for(lambda: service.cancelled == 1))
+        self.assertEqual(backend.cancelled_jobs, 1)
+
+    def test_failed_jobs_are_retried(self):
+        service = FakeRemoteService(latency=0.0, job_failure_rate=1.0, seed=0)
+        backend = self.make_backend(service, latency_budget=5.0, poll_interval=0.01,
+                                    coalesce_window=0.0, retries=2)
+
+        self.assertIn(backend.majority(CIRCUIT, INDEX, SHOTS), (0, 1))
+        self.assertEqual(service.submitted, 3)
+        self.assertEqual(backend.retried, 2)
+        self.assertEqual(backend.fallbacks, 1)
+
+    def test_failed_submissions_are_retried(self):
+        service = FakeRemoteService(submit_failure_rate=1.0, seed=0)
+        backend = self.make_backend(service, latency_budget=5.0, poll_interval=0.01,
+                                    coalesce_window=0.0, retries=2)
+
+        self.assertIn(backend.majority(CIRCUIT, INDEX, SHOTS), (0, 1))
+        self.assertEqual(service.submitted, 0)
+        self.assertEqual(backend.retried, 2)
+        self.assertEqual(backend.fallbacks, 1)
+
+    def test_polls_back_off(self):
+        service = FakeRemoteService(latency=1.0, seed=0)
+        backend = self.make_backend(service, latency_budget=5.0, poll_interval=0.01,
+                                    backoff=2.0, max_poll_interval=2.0, coalesce_window=0.0)
+
+        self.assertIn(backend.majority(CIRCUIT, INDEX, SHOTS), (0, 1))
+        self.assertEqual(backend.fallbacks, 0)
+        # 0.01 s doubling up to 1 s takes 7 polls, polling at a fixed 0.01 s
+        # would take 100
+        self.assertLessEqual(service.polls, 10)
+
+    def test_cancel_all_releases_waiting_callers(self):
+        service = FakeRemoteService(latency=10.0, seed=0)
+        backend = self.make_backend(service, latency_budget=10.0, coalesce_window=0.0)
+
+        threads, results = self.majority_in_threads(backend, 2)
+        self.assertTrue(wait_for(lambda: service.submitted == 1))
+
+        started = time.monotonic()
+        backend.cancel_all()
+        for thread in threads:
+            thread.join(2.0)
+            self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - started, 2.0)
+
+        self.assertTrue(all(result in (0, 1) for result in results))
+        self.assertEqual(backend.fallbacks, 2)
+        self.assertTrue(wait_for(lambda: service.cancelled == 1))
+
+    def test_stop_cancels_jobs_and_ends_the_thread(self):
+        service = FakeRemoteService(latency=10.0, seed=0)
+        backend = self.make_backend(service, latency_budget=10.0, coalesce_window=0.0)
+
+        threads, results = self.majority_in_threads(backend, 1)
+        self.assertTrue(wait_for(lambda: service.submitted == 1))
+
+        backend.stop()
+        threads[0].join(2.0)
+        self.assertFalse(threads[0].is_alive())
+        self.assertIn(results[0], (0, 1))
+        self.assertFalse(backend._thread.is_alive())
+        self.assertEqual(service.cancelled, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()